@@ -7,6 +7,7 @@ from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 import time
 from datetime import datetime, timedelta
+from spotify_pipeline_metrics import metrics, configure_logging
 
 # Setup download path
 download_path = "C:/Users/mikae/Documents/spotify_data_analysis_supplementary/spotify_official_csv/spotify_global"
@@ -47,9 +48,12 @@ def setup_driver():
         print(f"❌ Error initializing driver: {e}")
         return None
 
-def download_csv_for_date(driver, date, is_first_run=False):
-    """Download CSV for a specific date"""
-    url = f"https://charts.spotify.com/charts/view/regional-global-daily/{date}"
+def download_csv_for_date(driver, date, is_first_run=False, base_url="https://charts.spotify.com/charts/view/"):
+    """
+    Download CSV for a specific date
+    base_url: charts site to use, e.g. a local spotify_replay.FixtureServer for offline testing
+    """
+    url = f"{base_url}regional-global-daily/{date}"
     
     print(f"\n📅 Processing date: {date}")
     print(f"🌐 Navigating to: {url}")
@@ -81,6 +85,8 @@ def download_csv_for_date(driver, date, is_first_run=False):
         
         button_found = False
         for i, selector in enumerate(selectors_to_try):
+            if i > 0:
+                metrics.incr('selector_retries')
             try:
                 button = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, selector)))
                 
@@ -109,12 +115,20 @@ def download_csv_for_date(driver, date, is_first_run=False):
         print(f"❌ Error processing {date}: {e}")
         return False
 
-def main():
-    """Main function to download CSV files for multiple dates"""
+def main(start_date="2025-09-13", end_date="2025-10-02", confirm=True, base_url="https://charts.spotify.com/charts/view/",
+         metrics_file=None):
+    """
+    Main function to download CSV files for multiple dates
+    start_date / end_date: YYYY-MM-DD, inclusive
+    confirm: ask before starting and before closing the browser (the CLI passes False for --yes)
+    base_url: passed to download_csv_for_date
+    metrics_file: append the run metrics there as one JSON line (the CLI uses its own --metrics-file)
+    Returns the number of successful downloads
+    """
     
     # Define date range
-    START_DATE = "2025-09-13"  # Change this to your desired start date
-    END_DATE = "2025-10-02"    # Change this to your desired end date
+    START_DATE = start_date
+    END_DATE = end_date
     
     # Generate list of dates
     dates = generate_date_list(START_DATE, END_DATE)
@@ -122,15 +136,16 @@ def main():
     print(f"📅 Date range: {START_DATE} to {END_DATE}")
     
     # Confirm before starting
-    proceed = input(f"\nDo you want to download CSV files for all {len(dates)} dates? (y/n): ").lower().strip()
-    if proceed != 'y':
-        print("❌ Operation cancelled")
-        return
+    if confirm:
+        proceed = input(f"\nDo you want to download CSV files for all {len(dates)} dates? (y/n): ").lower().strip()
+        if proceed != 'y':
+            print("❌ Operation cancelled")
+            return 0
     
     # Initialize driver
     driver = setup_driver()
     if driver is None:
-        return
+        return 0
     
     successful_downloads = 0
     failed_downloads = 0
@@ -142,12 +157,15 @@ def main():
         for i, date in enumerate(dates):
             is_first_run = (i == 0)
             
-            success = download_csv_for_date(driver, date, is_first_run)
+            with metrics.stage('download', date=date):
+                success = download_csv_for_date(driver, date, is_first_run, base_url)
             
             if success:
                 successful_downloads += 1
+                metrics.incr('downloads_succeeded')
             else:
                 failed_downloads += 1
+                metrics.incr('downloads_failed')
             
             # Progress update
             print(f"📊 Progress: {i+1}/{len(dates)} completed")
@@ -180,8 +198,14 @@ def main():
         print(f"❌ Unexpected error: {e}")
     
     finally:
-        input("\nPress Enter to close browser...")
+        if metrics_file:
+            metrics.emit(metrics_file)
+        if confirm:
+            input("\nPress Enter to close browser...")
         driver.quit()
+    
+    return successful_downloads
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    configure_logging()
+    main(metrics_file='download_metrics.jsonl')
\ No newline at end of file
@@ -0,0 +1,313 @@
+# Command line entry point for the scrape, download and analysis scripts
+# Heavy libraries (pandas, bs4, selenium, plotting) are only imported inside the subcommand that needs them,
+# so short cron jobs and quick queries start fast.
+#
+# Examples:
+#   python spotify_cli.py scrape 19GxfaRs5KdurzPKLVX3Cq --view daily
+#   python spotify_cli.py download --start 2025-09-13 --end 2025-10-02 --yes
+#   python spotify_cli.py load --output chart_data.pkl
+#   python spotify_cli.py query --data-path chart_data.pkl --song-group twice_songs --start 2025-08-23 --end 2025-09-12
+#   python spotify_cli.py report --data-path chart_data.pkl --top 10
+#   python spotify_cli.py serve --port 8050
+#   python spotify_cli.py fixture-server --port 8060 --latency 0.05 --error-rate 0.1 --rate-limit-rate 0.1
+
+# Import useful packages
+import argparse
+import logging
+import os
+import sys
+from contextlib import nullcontext
+from datetime import datetime
+from spotify_pipeline_metrics import metrics, configure_logging, profiled
+
+def cmd_scrape(args):
+    """Scrape kworb song pages and save them as kworb_<view>_data.csv"""
+    from spotifyglobal_scrape_kworb import scrape_multiple_songs, get_song_id_from_spotify_url
+
+    # Accept plain track IDs or open.spotify.com track URLs
+    song_ids = [get_song_id_from_spotify_url(s) or s for s in args.song_ids]
+    views = ['weekly', 'daily'] if args.view == 'both' else [args.view]
+
+    # Record real responses to a cassette folder, or replay them without the network
+    session = None
+    if args.replay:
+        from spotify_replay import ReplaySession
+        session = ReplaySession(args.replay)
+    elif args.record:
+        from spotify_replay import RecordingSession
+        session = RecordingSession(args.record)
+
+    # Exit code 1 if any view produced no data, so cron jobs notice failed scrapes
+    exit_code = 0
+    for view_type in views:
+        df = scrape_multiple_songs(song_ids, args.base_url, args.delay, view_type, session, args.max_retries)
+        if df is None:
+            exit_code = 1
+            continue
+
+        output_file = os.path.join(args.output_dir, f'kworb_{view_type}_data.csv')
+        with metrics.stage('write', file=output_file):
+            df.to_csv(output_file, index=False)
+        print(f"{view_type.capitalize()} data saved to '{output_file}' ({len(df)} records)")
+
+    return exit_code
+
+def cmd_download(args):
+    """Download the Spotify Charts CSV files for a date range with the button clicker"""
+    import spotify_chart_csvbuttonclicker
+
+    successful_downloads = spotify_chart_csvbuttonclicker.main(args.start, args.end, confirm=not args.yes,
+                                                               base_url=args.base_url)
+    return 0 if successful_downloads else 1
+
+def cmd_load(args):
+    """Load the chart CSV files once and optionally save them as a pickle or dense matrix for fast reuse"""
+    from spotifyglobal_chart_data import load_chart_data
+
+    # With only --matrix-dir the full dataframe is not needed, the matrix reads just the new files
+    if args.output or not args.matrix_dir:
+        df = load_chart_data(args.data_path)
+        print(f"Loaded {len(df)} rows, {df['track_name'].nunique()} tracks, "
+              f"{df['date'].min():%Y-%m-%d} to {df['date'].max():%Y-%m-%d}")
+
+    if args.output:
+        with metrics.stage('write', file=args.output):
+            df.to_pickle(args.output)
+        print(f"Chart data saved to '{args.output}'")
+
+    if args.matrix_dir:
+        from spotifyglobal_chart_matrix import ChartMatrix
+
+        # Only the CSV files that are not in the saved matrix yet are read
+        if os.path.exists(os.path.join(args.matrix_dir, 'index.json')):
+            chart_matrix = ChartMatrix.load(args.matrix_dir)
+        else:
+            chart_matrix = ChartMatrix()
+        new_files = chart_matrix.add_csv_folders(args.data_path)
+        chart_matrix.save(args.matrix_dir)
+        print(f"Chart matrix {chart_matrix.shape} saved to '{args.matrix_dir}' ({new_files} new files)")
+
+    return 0
+
+def cmd_query(args):
+    """Filter the chart data with the same parameters as filter_spotify_data"""
+    import pandas as pd
+    from spotifyglobal_chart_data import load_chart_data, filter_spotify_data, SONG_GROUPS
+
+    songs = list(args.songs or [])
+    if args.song_group:
+        if args.song_group not in SONG_GROUPS:
+            print(f"Unknown song group: {args.song_group}. Available groups: {list(SONG_GROUPS)}")
+            return 1
+        songs += SONG_GROUPS[args.song_group]
+
+    df = load_chart_data(args.data_path)
+    filtered_df = filter_spotify_data(df, args.max_rank, songs or None, args.artists, args.start, args.end)
+
+    if args.columns:
+        filtered_df = filtered_df[args.columns]
+    if args.limit:
+        filtered_df = filtered_df.head(args.limit)
+
+    if args.output:
+        with metrics.stage('write', file=args.output):
+            filtered_df.to_csv(args.output, index=False)
+        print(f"{len(filtered_df)} rows saved to '{args.output}'")
+    else:
+        with pd.option_context('display.max_rows', None, 'display.width', None):
+            print(filtered_df)
+
+    return 0
+
+def cmd_report(args):
+    """Print daily totals, the top tracks, track trends and weekday effects, and save them as CSV if an output folder is given"""
+    from spotifyglobal_chart_data import load_chart_data, get_daily_totals, get_top_tracks, filter_spotify_data
+    from spotifyglobal_trends import fit_track_trends
+    from spotifyglobal_weekday import weekday_effects
+
+    df = load_chart_data(args.data_path)
+    df = filter_spotify_data(df, start_date=args.start, end_date=args.end)
+    if df.empty:
+        print("No data to report")
+        return 1
+
+    daily_totals = get_daily_totals(df)
+    top_tracks = get_top_tracks(df, args.top)
+
+    print(f"=== Chart report {df['date'].min():%Y-%m-%d} to {df['date'].max():%Y-%m-%d} ===")
+    print(f"Tracks: {df['track_name'].nunique()} | Days: {df['date'].nunique()} | Total streams: {df['streams'].sum():,}")
+    print("\n--- Daily totals ---")
+    print(daily_totals)
+    print(f"\n--- Top {args.top} tracks ---")
+    print(top_tracks)
+
+    trends = fit_track_trends(df)
+    trend_columns = ['days_on_chart', 'daily_growth_rate', 'exp_r2', 'half_life_days', 'projected_exit_date']
+    print("\n--- Fastest growing tracks ---")
+    print(trends.sort_values('daily_growth_rate', ascending=False)[trend_columns].head(args.top))
+    print("\n--- Fastest decaying tracks ---")
+    print(trends.sort_values('daily_growth_rate')[trend_columns].head(args.top))
+
+    track_weekday_effects, chart_weekday_effects = weekday_effects(df)
+    print("\n--- Day of week multipliers (all chart streams) ---")
+    print(chart_weekday_effects.round(3))
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        with metrics.stage('write', file=args.output_dir):
+            daily_totals.to_csv(os.path.join(args.output_dir, 'daily_totals.csv'))
+            top_tracks.to_csv(os.path.join(args.output_dir, 'top_tracks.csv'))
+            trends.to_csv(os.path.join(args.output_dir, 'track_trends.csv'))
+            track_weekday_effects.to_csv(os.path.join(args.output_dir, 'track_weekday_effects.csv'))
+        print(f"\nReport saved to '{args.output_dir}'")
+
+        if args.charts:
+            from spotifyglobal_chart_data import SONG_GROUPS
+            from spotifyglobal_render import render_charts
+
+            # One chart for the top tracks plus one per song group
+            chart_groups = {'top_tracks': list(top_tracks.index.get_level_values('track_name')), **SONG_GROUPS}
+            written = render_charts(df, chart_groups, os.path.join(args.output_dir, 'charts'), args.chart_format,
+                                    args.max_points)
+            print(f"{len(written)} charts saved to '{os.path.join(args.output_dir, 'charts')}'")
+
+    return 0
+
+def cmd_serve(args):
+    """Keep the chart data hot in memory and answer queries over HTTP"""
+    from spotifyglobal_service import serve
+
+    serve(args.data_path, args.host, args.port, args.cache_size, args.check_interval)
+    return 0
+
+def cmd_fixture_server(args):
+    """Serve the kworb pages and chart CSVs in the repo locally, with optional latency and injected failures"""
+    import time
+    from spotify_replay import FixtureServer
+
+    server = FixtureServer(args.host, args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                           rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after, seed=args.seed)
+    with server:
+        print(f"Fixture server on {server.url}")
+        print(f"  scrape:   --base-url {server.kworb_url}")
+        print(f"  download: --base-url {server.charts_url}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            print(f"\nStopping fixture server: {server.stats}")
+    return 0
+
+def date_arg(value):
+    """argparse type for YYYY-MM-DD dates, kept as the string"""
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date: {value!r}, expected YYYY-MM-DD")
+    return value
+
+def build_parser():
+    """Argument parser with one subcommand per pipeline step"""
+    parser = argparse.ArgumentParser(description="Spotify chart scraping and analysis")
+    parser.add_argument('--metrics-file', help="append the run metrics as one JSON line to this file")
+    parser.add_argument('--log-level', default='WARNING', help="structured log level (DEBUG logs every stage)")
+    parser.add_argument('--profile', choices=['cprofile', 'pyinstrument'], help="profile the subcommand")
+    parser.add_argument('--profile-output', help="profiler output file (printed if not given)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    scrape = subparsers.add_parser('scrape', help="scrape kworb song pages")
+    scrape.add_argument('song_ids', nargs='+', help="Spotify track IDs or track URLs")
+    scrape.add_argument('--view', choices=['weekly', 'daily', 'both'], default='weekly')
+    scrape.add_argument('--delay', type=float, default=2)
+    scrape.add_argument('--output-dir', default='.')
+    scrape.add_argument('--base-url', default="https://kworb.net/spotify/track/", help="e.g. a local fixture-server")
+    scrape.add_argument('--max-retries', type=int, default=3, help="retries for 429 and 5xx responses")
+    scrape.add_argument('--record', metavar='DIR', help="save every response to this cassette folder")
+    scrape.add_argument('--replay', metavar='DIR', help="answer from this cassette folder instead of the network")
+    scrape.set_defaults(func=cmd_scrape)
+
+    download = subparsers.add_parser('download', help="download Spotify Charts CSV files")
+    download.add_argument('--start', required=True, type=date_arg, help="YYYY-MM-DD")
+    download.add_argument('--end', required=True, type=date_arg, help="YYYY-MM-DD")
+    download.add_argument('--yes', action='store_true', help="do not ask for confirmation")
+    download.add_argument('--base-url', default="https://charts.spotify.com/charts/view/", help="e.g. a local fixture-server")
+    download.set_defaults(func=cmd_download)
+
+    # Shared by the subcommands that read the chart data
+    data_parser = argparse.ArgumentParser(add_help=False)
+    data_parser.add_argument('--data-path', default=None, help="CSV folder or .pkl file (default: spotify_global CSVs)")
+
+    load = subparsers.add_parser('load', parents=[data_parser], help="load the chart CSV files")
+    load.add_argument('--output', help="save the loaded data as a .pkl file")
+    load.add_argument('--matrix-dir', help="build or update the dense chart matrix saved in this folder")
+    load.set_defaults(func=cmd_load)
+
+    query = subparsers.add_parser('query', parents=[data_parser], help="filter the chart data")
+    query.add_argument('--max-rank', type=int)
+    query.add_argument('--songs', nargs='+')
+    query.add_argument('--song-group', help="name from SONG_GROUPS")
+    query.add_argument('--artists', nargs='+')
+    query.add_argument('--start', type=date_arg, help="YYYY-MM-DD, together with --end")
+    query.add_argument('--end', type=date_arg, help="YYYY-MM-DD, together with --start")
+    query.add_argument('--columns', nargs='+')
+    query.add_argument('--limit', type=int)
+    query.add_argument('--output', help="save the result as CSV")
+    query.set_defaults(func=cmd_query)
+
+    report = subparsers.add_parser('report', parents=[data_parser], help="daily totals, top tracks, trends and weekday effects")
+    report.add_argument('--start', type=date_arg, help="YYYY-MM-DD, together with --end")
+    report.add_argument('--end', type=date_arg, help="YYYY-MM-DD, together with --start")
+    report.add_argument('--top', type=int, default=10)
+    report.add_argument('--output-dir', help="save the report tables here")
+    report.add_argument('--charts', action='store_true', help="also render streams charts into <output-dir>/charts")
+    report.add_argument('--chart-format', default='html', help="html, or png/svg/pdf with kaleido installed")
+    report.add_argument('--max-points', type=int, default=1000, help="downsample each chart line to this many points")
+    report.set_defaults(func=cmd_report)
+
+    serve = subparsers.add_parser('serve', parents=[data_parser], help="local HTTP query service")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8050)
+    serve.add_argument('--cache-size', type=int, default=256, help="number of cached query results")
+    serve.add_argument('--check-interval', type=float, default=30, help="seconds between checks for new CSV files")
+    serve.set_defaults(func=cmd_serve)
+
+    fixture = subparsers.add_parser('fixture-server', help="local kworb / Spotify Charts stand-in for offline tests")
+    fixture.add_argument('--host', default='127.0.0.1')
+    fixture.add_argument('--port', type=int, default=8060)
+    fixture.add_argument('--latency', type=float, default=0, help="seconds added to every response")
+    fixture.add_argument('--jitter', type=float, default=0, help="up to this many extra seconds per response")
+    fixture.add_argument('--error-rate', type=float, default=0, help="share of requests answered 503")
+    fixture.add_argument('--rate-limit-rate', type=float, default=0, help="share of requests answered 429")
+    fixture.add_argument('--retry-after', type=int, default=1, help="Retry-After seconds sent with 429s")
+    fixture.add_argument('--seed', type=int, default=0, help="seed for the injected failures")
+    fixture.set_defaults(func=cmd_fixture_server)
+
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    # filter_spotify_data only filters on dates when both are given
+    if args.command in ('query', 'report') and (args.start is None) != (args.end is None):
+        parser.error("--start and --end must be given together")
+    if args.command == 'report' and args.charts and not args.output_dir:
+        parser.error("--charts requires --output-dir")
+
+    if getattr(args, 'data_path', '') is None:
+        from spotifyglobal_chart_data import DEFAULT_DATA_PATH
+        args.data_path = DEFAULT_DATA_PATH
+
+    configure_logging(getattr(logging, args.log_level.upper(), logging.WARNING))
+    metrics.run_name = args.command
+
+    profiler = profiled(args.profile_output, args.profile) if args.profile else nullcontext()
+    with profiler:
+        exit_code = args.func(args)
+
+    if args.metrics_file:
+        metrics.emit(args.metrics_file)
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main())
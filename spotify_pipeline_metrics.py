@@ -0,0 +1,188 @@
+# Timing and metrics instrumentation for the scrape and analysis pipeline
+
+# Import useful packages
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger("spotify_pipeline")
+
+class PipelineMetrics:
+    """
+    Collects per-stage timers and counters for one pipeline run
+    Stages: fetch, parse, extract_rows, build_df, write (any name works)
+    Counters: bytes_downloaded, rows, retries, cache_hits, cache_misses, ...
+    Safe to update from several threads (load tests, the query service)
+    """
+
+    def __init__(self, run_name="pipeline"):
+        self.run_name = run_name
+        self.started_at = datetime.now()
+        self.stages = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def reset(self):
+        """Clear all timers and counters and restart the run clock"""
+        with self.lock:
+            self.started_at = datetime.now()
+            self.stages = {}
+            self.counters = {}
+
+    @contextmanager
+    def separate_run(self, run_name):
+        """
+        Collect the metrics of a block as their own run (e.g. a load test)
+        The timers and counters collected before are restored afterwards
+        """
+        with self.lock:
+            saved = (self.run_name, self.started_at, self.stages, self.counters)
+            self.run_name, self.started_at, self.stages, self.counters = run_name, datetime.now(), {}, {}
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.run_name, self.started_at, self.stages, self.counters = saved
+
+    @contextmanager
+    def stage(self, name, **fields):
+        """
+        Time a block of code under a stage name
+        Extra keyword fields are attached to the structured log line
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                entry = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+                entry['calls'] += 1
+                entry['seconds'] += elapsed
+                entry['max_seconds'] = max(entry['max_seconds'], elapsed)
+
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(json.dumps({'event': 'stage', 'stage': name, 'seconds': round(elapsed, 6), **fields}, default=str))
+
+    def incr(self, name, amount=1):
+        """Increase a counter (bytes_downloaded, rows, retries, cache_hits, ...)"""
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record_cache(self, hit):
+        """Count a cache lookup as a hit or a miss"""
+        self.incr('cache_hits' if hit else 'cache_misses')
+
+    def summary(self):
+        """
+        Return a JSON-serialisable summary of the run
+        Derived values: rows per second (over the timed stages) and cache hit rate
+        """
+        with self.lock:
+            stage_entries = {name: dict(entry) for name, entry in self.stages.items()}
+            counters = dict(self.counters)
+
+        total_seconds = sum(entry['seconds'] for entry in stage_entries.values())
+        rows = counters.get('rows', 0)
+        cache_lookups = counters.get('cache_hits', 0) + counters.get('cache_misses', 0)
+
+        stages = {}
+        for name, entry in stage_entries.items():
+            stages[name] = {
+                'calls': entry['calls'],
+                'seconds': round(entry['seconds'], 6),
+                'mean_seconds': round(entry['seconds'] / entry['calls'], 6),
+                'max_seconds': round(entry['max_seconds'], 6),
+            }
+
+        return {
+            'run': self.run_name,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'wall_seconds': round((datetime.now() - self.started_at).total_seconds(), 3),
+            'stage_seconds': round(total_seconds, 6),
+            'stages': stages,
+            'counters': counters,
+            'rows_per_second': round(rows / total_seconds, 2) if total_seconds > 0 else None,
+            'cache_hit_rate': round(counters.get('cache_hits', 0) / cache_lookups, 4) if cache_lookups else None,
+        }
+
+    def emit(self, metrics_file=None):
+        """
+        Emit the summary as a structured log line
+        If metrics_file is given, also append it there as one JSON line
+        """
+        summary = self.summary()
+        line = json.dumps(summary, default=str)
+        logger.info(line)
+
+        if metrics_file:
+            directory = os.path.dirname(metrics_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(metrics_file, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+
+        return summary
+
+# Shared instance used by the scraper, downloader and analysis scripts
+metrics = PipelineMetrics()
+
+def configure_logging(level=logging.INFO, log_file=None):
+    """
+    Send the structured pipeline logs to stderr (or to log_file)
+    Use level=logging.DEBUG to also get one log line per timed stage call
+    """
+    handler = logging.FileHandler(log_file, encoding='utf-8') if log_file else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.handlers = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
+
+@contextmanager
+def profiled(output_file=None, engine='cprofile'):
+    """
+    Optional profiler hook around a block of pipeline code
+    engine: 'cprofile' (standard library) or 'pyinstrument' (needs pip install pyinstrument)
+    Writes the report to output_file if given, otherwise prints the top entries
+    """
+    if engine == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("pyinstrument not installed. Install with: pip install pyinstrument")
+            yield
+            return
+
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            if output_file:
+                with open(output_file, 'w', encoding='utf-8') as f:
+                    f.write(profiler.output_html() if output_file.endswith('.html') else profiler.output_text())
+            else:
+                print(profiler.output_text())
+
+    elif engine == 'cprofile':
+        import cProfile
+        import pstats
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            if output_file:
+                profiler.dump_stats(output_file)
+            else:
+                pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+
+    else:
+        raise ValueError(f"Invalid profiler engine: {engine}. Use 'cprofile' or 'pyinstrument'")
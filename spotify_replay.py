@@ -0,0 +1,344 @@
+# Offline record/replay harness for the kworb and Spotify Charts fetchers
+# - RecordingSession / ReplaySession: drop-in `session` for parse_kworb_song_page that saves real responses
+#   to a cassette folder and plays them back without the network
+# - FixtureServer: local HTTP server with kworb song pages and Spotify Charts CSVs seeded from the files in
+#   this repo, with configurable latency, error injection and 429 rate limiting
+# Faults are decided from a hash of (seed, path, client id, attempt), where FixtureClientSession sends its own
+# client id and attempt number, so load tests are deterministic even when many concurrent clients hit one URL.
+# Other clients are keyed on the request number for the path, which is only deterministic for sequential
+# clients or distinct URLs.
+#
+# Example:
+#   with FixtureServer(latency=0.05, error_rate=0.1, rate_limit_rate=0.1) as server:
+#       run_scrape_load_test(server.kworb_url, ['19GxfaRs5KdurzPKLVX3Cq'] * 50, workers=8)
+
+# Import useful packages
+import glob
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from spotify_pipeline_metrics import metrics
+
+REPO_PATH = os.path.dirname(os.path.abspath(__file__))
+
+# kworb page saved in the repo and the track it belongs to
+DEFAULT_KWORB_PAGES = {
+    '19GxfaRs5KdurzPKLVX3Cq': os.path.join(REPO_PATH, 'TWICE - TAKEDOWN (JEONGYEON, JIHYO, CHAEYOUNG) - Spotify Chart History.html'),
+}
+
+# Spotify Charts CSV folders in the repo
+DEFAULT_CSV_FOLDERS = [
+    os.path.join(REPO_PATH, 'spotify_data_analysis_supplementary', 'spotify_official_csv', 'spotify_global'),
+    os.path.join(REPO_PATH, 'spotify_data_analysis_supplementary', 'spotify_official_csv', 'spotify_usa'),
+]
+
+class ReplayHeaders(dict):
+    """Response headers with case-insensitive get(), like requests"""
+
+    def __init__(self, headers=None):
+        super().__init__((key.lower(), value) for key, value in (headers or {}).items())
+
+    def get(self, key, default=None):
+        return super().get(key.lower(), default)
+
+    def __getitem__(self, key):
+        return super().__getitem__(key.lower())
+
+class ReplayResponse:
+    """The parts of requests.Response the scrapers use: status_code, content, text, headers, url"""
+
+    def __init__(self, url, status_code, content, headers=None, encoding='utf-8'):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = ReplayHeaders(headers)
+        self.encoding = encoding
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+def cassette_key(url):
+    """File name stem for a recorded URL"""
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+def save_response(cassette_dir, url, status_code, content, headers=None, encoding='utf-8'):
+    """Store one response as <key>.json (metadata) and <key>.body (raw bytes)"""
+    os.makedirs(cassette_dir, exist_ok=True)
+    key = cassette_key(url)
+    with open(os.path.join(cassette_dir, f'{key}.body'), 'wb') as f:
+        f.write(content)
+    with open(os.path.join(cassette_dir, f'{key}.json'), 'w', encoding='utf-8') as f:
+        json.dump({'url': url, 'status_code': status_code, 'headers': dict(headers or {}),
+                   'encoding': encoding}, f, indent=2)
+
+def seed_cassette(cassette_dir, pages=None, base_url="https://kworb.net/spotify/track/"):
+    """
+    Record the kworb pages saved in the repo as if they had been fetched from base_url
+    pages: {track id: html file}, defaults to DEFAULT_KWORB_PAGES
+    """
+    pages = pages or DEFAULT_KWORB_PAGES
+    for track_id, html_file in pages.items():
+        with open(html_file, 'rb') as f:
+            save_response(cassette_dir, f'{base_url}{track_id}.html', 200, f.read(),
+                          {'Content-Type': 'text/html; charset=UTF-8'})
+    return len(pages)
+
+class RecordingSession:
+    """
+    Fetch through a real session (requests by default) and save every response to cassette_dir
+    A later response for the same URL (e.g. a 200 after a 429 retry) replaces the earlier one
+    """
+
+    def __init__(self, cassette_dir, session=None):
+        import requests
+
+        self.cassette_dir = cassette_dir
+        self.session = session or requests.Session()
+
+    def get(self, url, headers=None, **kwargs):
+        response = self.session.get(url, headers=headers, **kwargs)
+        save_response(self.cassette_dir, url, response.status_code, response.content, response.headers,
+                      response.encoding)
+        metrics.incr('responses_recorded')
+        return response
+
+class ReplaySession:
+    """
+    Answer get() from a cassette folder without touching the network
+    latency: seconds to sleep per request, to keep timing-dependent code realistic
+    Unrecorded URLs raise KeyError so missing fixtures are never silently mistaken for real data
+    """
+
+    def __init__(self, cassette_dir, latency=0.0):
+        self.cassette_dir = cassette_dir
+        self.latency = latency
+
+    def get(self, url, headers=None, **kwargs):
+        key = cassette_key(url)
+        meta_file = os.path.join(self.cassette_dir, f'{key}.json')
+        if not os.path.exists(meta_file):
+            raise KeyError(f"No recorded response for {url} in {self.cassette_dir}")
+
+        with open(meta_file, encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(os.path.join(self.cassette_dir, f'{key}.body'), 'rb') as f:
+            content = f.read()
+
+        if self.latency:
+            time.sleep(self.latency)
+        metrics.incr('responses_replayed')
+        return ReplayResponse(url, meta['status_code'], content, meta['headers'], meta.get('encoding') or 'utf-8')
+
+class FixtureClientSession:
+    """
+    Session for one load-test client of a FixtureServer
+    Numbers its own requests per URL and sends the client id and attempt number as X-Fixture-Client /
+    X-Fixture-Attempt headers, so the injected faults do not depend on thread scheduling
+    session: the session to send through (requests by default)
+    """
+
+    def __init__(self, client_id, session=None):
+        import requests
+
+        self.client_id = client_id
+        self.session = session or requests
+        self.attempts = {}
+
+    def get(self, url, headers=None, **kwargs):
+        attempt = self.attempts.get(url, 0)
+        self.attempts[url] = attempt + 1
+        headers = {**(headers or {}), 'X-Fixture-Client': str(self.client_id), 'X-Fixture-Attempt': str(attempt)}
+        return self.session.get(url, headers=headers, **kwargs)
+
+class FixtureServer:
+    """
+    Local stand-in for kworb.net and charts.spotify.com
+
+    Routes:
+      /spotify/track/<id>.html                 kworb song page (pages[id], or default_page for any other id)
+      /charts/view/regional-<region>-daily/<date>  page with the csv_download button the button clicker looks for
+      /charts/csv/regional-<region>-daily-<date>.csv  the CSV file from csv_folders
+      /stats                                   JSON counters of served, failed and rate limited requests
+
+    Faults (deterministic for a given seed):
+      latency + up to jitter seconds per request
+      rate_limit_rate: share of requests answered 429 with Retry-After: retry_after
+      error_rate: share of requests answered 503
+    Requests from a FixtureClientSession are keyed on (client id, attempt), other requests on the request
+    number for their path, which depends on the order concurrent clients arrive in
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, pages=None, default_page=None, csv_folders=None,
+                 latency=0.0, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0, retry_after=1, seed=0):
+        self.pages = pages or DEFAULT_KWORB_PAGES
+        self.default_page = default_page if default_page is not None else next(iter(self.pages.values()))
+        self.csv_files = {os.path.basename(f): f
+                          for folder in (csv_folders or DEFAULT_CSV_FOLDERS)
+                          for f in glob.glob(os.path.join(folder, '*.csv'))}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.seed = seed
+
+        self.lock = threading.Lock()
+        self.path_counts = {}
+        self.stats = {'requests': 0, 'served': 0, 'not_found': 0, 'errors_injected': 0, 'rate_limited': 0}
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def kworb_url(self):
+        """base_url for scrape_multiple_songs"""
+        return f"{self.url}/spotify/track/"
+
+    @property
+    def charts_url(self):
+        """base_url for spotify_chart_csvbuttonclicker.main"""
+        return f"{self.url}/charts/view/"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _draw(self, path, client=None):
+        """
+        Two deterministic numbers in [0, 1) for a request
+        client: (client id, attempt) sent by a FixtureClientSession, otherwise the n-th request of this path is used
+        """
+        with self.lock:
+            n = self.path_counts.get(path, 0)
+            self.path_counts[path] = n + 1
+            self.stats['requests'] += 1
+        key = f'{self.seed}:{path}:client={client[0]}:{client[1]}' if client else f'{self.seed}:{path}:{n}'
+        digest = hashlib.sha256(key.encode('utf-8')).digest()
+        return int.from_bytes(digest[:8], 'big') / 2 ** 64, int.from_bytes(digest[8:16], 'big') / 2 ** 64
+
+    def _count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def respond(self, path, client=None):
+        """Return (status, headers, body) for a request path, after latency and fault injection"""
+        fault, delay = self._draw(path, client)
+        wait = self.latency + self.jitter * delay
+        if wait:
+            time.sleep(wait)
+
+        if path == '/stats':
+            with self.lock:
+                return 200, {'Content-Type': 'application/json'}, json.dumps(self.stats).encode('utf-8')
+
+        if fault < self.rate_limit_rate:
+            self._count('rate_limited')
+            return 429, {'Retry-After': str(self.retry_after), 'Content-Type': 'text/plain'}, b'Too Many Requests'
+        if fault < self.rate_limit_rate + self.error_rate:
+            self._count('errors_injected')
+            return 503, {'Content-Type': 'text/plain'}, b'Service Unavailable'
+
+        status, headers, body = self._route(path)
+        self._count('served' if status == 200 else 'not_found')
+        return status, headers, body
+
+    def _route(self, path):
+        not_found = (404, {'Content-Type': 'text/plain'}, b'Not Found')
+
+        track_match = re.fullmatch(r'/spotify/track/([A-Za-z0-9]+)\.html', path)
+        if track_match:
+            html_file = self.pages.get(track_match.group(1), self.default_page)
+            if not html_file:
+                return not_found
+            with open(html_file, 'rb') as f:
+                return 200, {'Content-Type': 'text/html; charset=UTF-8'}, f.read()
+
+        view_match = re.fullmatch(r'/charts/view/regional-([a-z]+)-daily/(\d{4}-\d{2}-\d{2})', path)
+        if view_match:
+            region, date = view_match.groups()
+            csv_name = f'regional-{region}-daily-{date}.csv'
+            if csv_name not in self.csv_files:
+                return not_found
+            page = (f'<html><body><h1>regional-{region}-daily {date}</h1>'
+                    f'<a href="/charts/csv/{csv_name}" download="{csv_name}">'
+                    f'<button aria-labelledby="csv_download" data-encore-id="buttonTertiary">CSV</button></a>'
+                    f'</body></html>')
+            return 200, {'Content-Type': 'text/html; charset=UTF-8'}, page.encode('utf-8')
+
+        csv_match = re.fullmatch(r'/charts/csv/([\w.-]+\.csv)', path)
+        if csv_match and csv_match.group(1) in self.csv_files:
+            with open(self.csv_files[csv_match.group(1)], 'rb') as f:
+                return 200, {'Content-Type': 'text/csv; charset=UTF-8',
+                             'Content-Disposition': f'attachment; filename="{csv_match.group(1)}"'}, f.read()
+
+        return not_found
+
+    def _make_handler(self):
+        fixture = self
+
+        class FixtureRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                client = self.headers.get('X-Fixture-Client')
+                attempt = self.headers.get('X-Fixture-Attempt')
+                status, headers, body = fixture.respond(self.path.split('?')[0], (client, attempt) if client else None)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return FixtureRequestHandler
+
+def run_scrape_load_test(base_url, song_ids, workers=8, view_type='daily', session=None, max_retries=3,
+                         retry_backoff=0.1):
+    """
+    Scrape song_ids concurrently against base_url (usually a FixtureServer) with no politeness delay
+    Every song is its own FixtureClientSession client (sending through session), so repeated ids still get
+    the same injected faults on every run
+    Returns the pipeline metrics summary plus songs scraped, failed and songs per second
+    The load test is collected as a separate run, metrics the caller already collected are kept
+    """
+    from spotifyglobal_scrape_kworb import parse_kworb_song_page
+
+    def scrape(client_id, song_id):
+        client_session = FixtureClientSession(client_id, session)
+        return parse_kworb_song_page(f'{base_url}{song_id}.html', 0, view_type, client_session, max_retries,
+                                     retry_backoff)
+
+    with metrics.separate_run('scrape_load_test'):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(scrape, range(len(song_ids)), song_ids))
+        elapsed = time.perf_counter() - start
+        summary = metrics.summary()
+
+    summary['songs_scraped'] = sum(df is not None for df in results)
+    summary['songs_failed'] = sum(df is None for df in results)
+    summary['elapsed_seconds'] = round(elapsed, 3)
+    summary['songs_per_second'] = round(len(song_ids) / elapsed, 2) if elapsed > 0 else None
+    return summary
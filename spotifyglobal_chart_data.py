@@ -0,0 +1,167 @@
+# Loading and filtering of the Spotify Charts daily CSV files
+# Only needs pandas, so the CLI and other scripts can use it without the plotting/regression libraries
+
+# Import libraries
+import pandas as pd
+import glob
+import os
+import re
+from spotify_pipeline_metrics import metrics
+
+# Default folder with the downloaded regional-global-daily-YYYY-MM-DD.csv files
+DEFAULT_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 'spotify_data_analysis_supplementary', 'spotify_official_csv', 'spotify_global')
+
+SONG_GROUPS = {
+    'twice_songs': [
+        'TAKEDOWN (JEONGYEON, JIHYO, CHAEYOUNG)',
+        'Strategy'
+    ],
+    'KPDH_songs': [
+        'Golden',
+        'Your Idol',
+        'Soda Pop',
+        'How It’s Done',
+        'What It Sounds Like',
+        'Free',
+        'Takedown',
+        'TAKEDOWN (JEONGYEON, JIHYO, CHAEYOUNG)',
+        'Strategy'
+    ],
+    'KPDH_songs_excluding_twice': [
+        'Golden',
+        'Your Idol',
+        'Soda Pop',
+        'How It’s Done',
+        'What It Sounds Like',
+        'Free',
+        'Takedown',
+    ],
+    'one_song': [
+        'TAKEDOWN (JEONGYEON, JIHYO, CHAEYOUNG)'
+    ]
+}
+
+# Read csv files
+# Flow:
+# Read all csv and append it into the dataframes list
+# Get the dates and region (regional-<region>-daily-...) off the path and put them into their own columns
+def read_spotify_files(all_files):
+    dataframes = []
+
+    for file in all_files:
+        date_match = re.search(r'(\d{4}-\d{2}-\d{2})', file)
+        if date_match:
+            date_str = date_match.group(1)
+        date = pd.to_datetime(date_str)
+        region_match = re.search(r'regional-([a-z]+)-daily', os.path.basename(file))
+        region = region_match.group(1) if region_match else 'global'
+
+        with metrics.stage('read_csv', file=file):
+            df = pd.read_csv(file)
+        metrics.incr('files_read')
+        metrics.incr('bytes_read', os.path.getsize(file))
+        df['date'] = date
+        df['region'] = region
+        dataframes.append(df)
+
+    with metrics.stage('build_df'):
+        combined_df = pd.concat(dataframes, ignore_index=True)
+    metrics.incr('rows', len(combined_df))
+    return combined_df
+
+def read_spotify_data(file_pattern):
+    return read_spotify_files(glob.glob(file_pattern))
+
+def add_change_columns(df):
+    """
+    Add streams_change, streams_percent_change, day_of_week and is_weekend columns
+    """
+    # Calculate daily streams change, replace NaN with 0.
+    # Sort values and group by needed because .diff() calculates the diff between rows.
+    df = df.sort_values(['track_name', 'date'])
+    df['streams_change'] = df.groupby('track_name')['streams'].diff().fillna(0)
+
+    # Calculate percentage change of streams
+    df['streams_percent_change'] = df.groupby('track_name')['streams'].pct_change().fillna(0) * 100
+
+    # Get day of week, mark if weekend
+    df['day_of_week'] = df['date'].dt.day_name()
+    df['is_weekend'] = df['date'].dt.weekday >= 5
+
+    return df
+
+def get_daily_totals(df):
+    """Daily stream totals dataframe"""
+    daily_totals = df.groupby('date').agg({
+        'streams' : 'sum',
+        'streams_change' : 'mean'
+    }).rename(columns={
+        'streams_change' : 'mean_streams_change'
+    })
+
+    daily_totals['day_of_week'] = daily_totals.index.day_name()
+    daily_totals['is_weekend'] = daily_totals.index.weekday >= 5
+
+    return daily_totals
+
+def get_top_tracks(df, n=10):
+    """Tracks with the most total streams, with best rank and days on chart"""
+    return (df.groupby(['track_name', 'artist_names'])
+              .agg(total_streams=('streams', 'sum'),
+                   best_rank=('rank', 'min'),
+                   days_on_chart=('date', 'nunique'))
+              .sort_values('total_streams', ascending=False)
+              .head(n))
+
+def load_chart_data(path=DEFAULT_DATA_PATH):
+    """
+    Load the chart dataset with the change columns added
+    path: folder of daily CSV files, or a .pkl file saved by the CLI 'load --output' command
+    """
+    if path.endswith('.pkl'):
+        with metrics.stage('read_pickle', file=path):
+            return pd.read_pickle(path)
+
+    df = read_spotify_data(os.path.join(path, '*.csv'))
+    return add_change_columns(df)
+
+# Functions to filter the dataframe
+
+def filter_by_rank(df, max_rank):
+    return df[(df['rank'] <= max_rank)]
+
+def filter_by_songs(df, songs):
+    if isinstance(songs, str):
+        songs = [songs]
+    return df[df['track_name'].isin(songs)]
+
+def filter_by_date_range(df, start_date, end_date):
+    return df[(df['date'] >= start_date) & (df['date'] <= end_date)]
+
+def filter_by_artist(df, artists):
+    if isinstance(artists, str):
+        artists = [artists]
+    return df[df['artist_names'].isin(artists)]
+
+def filter_spotify_data(df,
+                        max_rank=None,
+                        songs=None,
+                        artists=None,
+                        start_date=None,
+                        end_date=None,
+                        ):
+    """
+    Master filtering function with multiple optional parameters
+    """
+    filtered_df = df.copy()
+    if max_rank:
+        filtered_df = filter_by_rank(filtered_df, max_rank)
+    if songs:
+        filtered_df = filter_by_songs(filtered_df, songs)
+    if artists:
+        filtered_df = filter_by_artist(filtered_df, artists)
+    if start_date and end_date:
+        filtered_df = filter_by_date_range(filtered_df, start_date, end_date)
+
+    return filtered_df
@@ -0,0 +1,230 @@
+# Dense (track x date x region) representation of the chart data for cross-track analytics
+# Built once from the daily CSV files, updated incrementally as new files land, and saved as .npy
+# files that can be memory-mapped so large histories do not have to fit in RAM.
+
+# Import libraries
+import numpy as np
+import pandas as pd
+import glob
+import json
+import os
+from spotify_pipeline_metrics import metrics
+from spotifyglobal_chart_data import read_spotify_files
+
+class ChartMatrix:
+    """
+    streams / rank arrays of shape (tracks, dates, regions), NaN where a track was not on that chart
+    Index maps: track_index (uri -> row), date_index (datetime64[D] -> column), region_index (region -> layer)
+    track_names[i] is the display name of row i
+    """
+
+    def __init__(self):
+        self.tracks = []
+        self.track_names = []
+        self.dates = np.array([], dtype='datetime64[D]')
+        self.regions = []
+        self.track_index = {}
+        self.date_index = {}
+        self.region_index = {}
+        self.streams = np.empty((0, 0, 0), dtype=np.float64)
+        self.rank = np.empty((0, 0, 0), dtype=np.float32)
+        self.loaded_files = set()
+
+    @property
+    def shape(self):
+        return self.streams.shape
+
+    @classmethod
+    def from_dataframe(cls, df, region='global'):
+        """Build the matrix from a long chart dataframe (region column optional)"""
+        matrix = cls()
+        matrix.update(df, region)
+        return matrix
+
+    @classmethod
+    def from_csv_folders(cls, folders):
+        """Build the matrix from one or more folders of regional-<region>-daily-YYYY-MM-DD.csv files"""
+        matrix = cls()
+        matrix.add_csv_folders(folders)
+        return matrix
+
+    def add_csv_folders(self, folders):
+        """
+        Read only the CSV files that are not in the matrix yet and add them
+        Returns the number of new files
+        """
+        if isinstance(folders, str):
+            folders = [folders]
+
+        all_files = sorted(f for folder in folders for f in glob.glob(os.path.join(folder, '*.csv')))
+        new_files = [f for f in all_files if os.path.basename(f) not in self.loaded_files]
+        if not new_files:
+            return 0
+
+        self.update(read_spotify_files(new_files))
+        self.loaded_files.update(os.path.basename(f) for f in new_files)
+        return len(new_files)
+
+    def update(self, df, region='global'):
+        """
+        Add the rows of a long chart dataframe, growing the arrays for new tracks, dates and regions
+        Existing cells for the same (track, date, region) are overwritten
+        """
+        if df.empty:
+            return self
+
+        track_keys = df['uri'] if 'uri' in df.columns else df['track_name']
+        dates = df['date'].to_numpy().astype('datetime64[D]')
+        regions = df['region'] if 'region' in df.columns else pd.Series(region, index=df.index)
+
+        with metrics.stage('matrix_update'):
+            # New tracks and regions are appended, dates are kept sorted
+            new_tracks = pd.unique(track_keys[~track_keys.isin(list(self.track_index))])
+            if 'uri' in df.columns:
+                names = df.drop_duplicates('uri').set_index('uri')['track_name']
+                self.track_names.extend(names.loc[new_tracks])
+            else:
+                self.track_names.extend(new_tracks)
+            self.tracks.extend(new_tracks)
+            self.regions.extend(r for r in pd.unique(regions) if r not in self.region_index)
+            all_dates = np.union1d(self.dates, np.unique(dates))
+            self._grow(all_dates)
+
+            # Memory-mapped arrays are read-only, copy them before writing
+            if not self.streams.flags.writeable:
+                self.streams = np.array(self.streams)
+                self.rank = np.array(self.rank)
+
+            # Scatter the values into their cells
+            rows = track_keys.map(self.track_index).to_numpy()
+            columns = np.searchsorted(self.dates, dates)
+            layers = regions.map(self.region_index).to_numpy()
+            self.streams[rows, columns, layers] = df['streams'].to_numpy(dtype=np.float64)
+            if 'rank' in df.columns:
+                self.rank[rows, columns, layers] = df['rank'].to_numpy(dtype=np.float32)
+
+        metrics.incr('matrix_rows_added', len(df))
+        return self
+
+    def _grow(self, all_dates):
+        """Resize the arrays to the current tracks/regions and the new date axis, keeping old values"""
+        old_shape = self.streams.shape
+        new_shape = (len(self.tracks), len(all_dates), len(self.regions))
+        if new_shape != old_shape:
+            old_columns = np.searchsorted(all_dates, self.dates)
+            for name in ('streams', 'rank'):
+                old = getattr(self, name)
+                grown = np.full(new_shape, np.nan, dtype=old.dtype)
+                grown[:old_shape[0], old_columns, :old_shape[2]] = old
+                setattr(self, name, grown)
+
+        self.dates = all_dates
+        self.track_index = {track: i for i, track in enumerate(self.tracks)}
+        self.date_index = {date: i for i, date in enumerate(self.dates)}
+        self.region_index = {region: i for i, region in enumerate(self.regions)}
+
+    def save(self, folder):
+        """Save the arrays as .npy files plus an index.json with the index maps"""
+        os.makedirs(folder, exist_ok=True)
+        with metrics.stage('write', file=folder):
+            for name in ('streams', 'rank'):
+                array = getattr(self, name)
+                file = os.path.join(folder, f'{name}.npy')
+
+                # Arrays still memory-mapped from this file are unchanged (update() copies them), skip them
+                if (isinstance(array, np.memmap) and array.filename and os.path.exists(file)
+                        and os.path.samefile(array.filename, file)):
+                    continue
+                np.save(file, array)
+
+            with open(os.path.join(folder, 'index.json'), 'w', encoding='utf-8') as f:
+                json.dump({
+                    'tracks': list(self.tracks),
+                    'track_names': list(self.track_names),
+                    'dates': [str(d) for d in self.dates],
+                    'regions': list(self.regions),
+                    'loaded_files': sorted(self.loaded_files),
+                }, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, folder, mmap_mode='r'):
+        """
+        Load a matrix saved with save()
+        mmap_mode='r' memory-maps the arrays (read-only), use None to load them into memory
+        update() always works: growing the arrays copies them into memory
+        """
+        with open(os.path.join(folder, 'index.json'), encoding='utf-8') as f:
+            index = json.load(f)
+
+        matrix = cls()
+        matrix.tracks = index['tracks']
+        matrix.track_names = index['track_names']
+        matrix.regions = index['regions']
+        matrix.loaded_files = set(index['loaded_files'])
+        matrix.streams = np.load(os.path.join(folder, 'streams.npy'), mmap_mode=mmap_mode)
+        matrix.rank = np.load(os.path.join(folder, 'rank.npy'), mmap_mode=mmap_mode)
+        matrix._grow(np.array(index['dates'], dtype='datetime64[D]'))
+        return matrix
+
+    # Array views for analysis
+
+    def region_slice(self, region='global', value='streams'):
+        """(tracks x dates) matrix of streams or rank for one region"""
+        return getattr(self, value)[:, :, self.region_index[region]]
+
+    def track_rows(self, track_names):
+        """Row numbers for a list of track names (all rows that share a name)"""
+        names = np.asarray(self.track_names, dtype=object)
+        return np.flatnonzero(np.isin(names, list(track_names)))
+
+    def track_correlation(self, region='global', value='streams', min_overlap=7):
+        """
+        Pairwise Pearson correlation between all tracks over the dates both were on the chart
+        Computed with matrix products of the masked values, NaN where fewer than min_overlap shared dates
+        """
+        y = np.asarray(self.region_slice(region, value), dtype=np.float64)
+        mask = np.isfinite(y).astype(np.float64)
+        y = np.where(mask > 0, y, 0.0)
+
+        n = mask @ mask.T
+        sum_x = y @ mask.T
+        sum_xx = (y * y) @ mask.T
+        sum_xy = y @ y.T
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            covariance = n * sum_xy - sum_x * sum_x.T
+            variance = (n * sum_xx - sum_x ** 2) * (n * sum_xx.T - sum_x.T ** 2)
+            correlation = covariance / np.sqrt(variance)
+        correlation[n < min_overlap] = np.nan
+        return correlation
+
+    def similar_tracks(self, track_name, region='global', top=10, min_overlap=7):
+        """Tracks whose daily streams move most like track_name (highest correlation)"""
+        rows = self.track_rows([track_name])
+        if len(rows) == 0:
+            raise KeyError(f"Track not in matrix: {track_name}")
+
+        correlation = self.track_correlation(region, 'streams', min_overlap)[rows[0]]
+        correlation[rows] = np.nan
+        order = np.argsort(-np.nan_to_num(correlation, nan=-np.inf))[:top]
+        return pd.Series(correlation[order], index=[self.track_names[i] for i in order], name='correlation')
+
+    def cohort_curves(self, region='global', value='streams', max_days=None):
+        """
+        Align every track on its first chart day: (tracks x days since chart entry)
+        Lets cohorts of songs be compared by age instead of calendar date
+        """
+        y = np.asarray(self.region_slice(region, value), dtype=np.float64)
+        observed = np.isfinite(y)
+        first = np.where(observed.any(axis=1), observed.argmax(axis=1), y.shape[1])
+
+        days = np.arange(max_days or y.shape[1])
+        columns = first[:, None] + days[None, :]
+        in_range = columns < y.shape[1]
+        aligned = np.take_along_axis(y, np.minimum(columns, y.shape[1] - 1), axis=1)
+        return np.where(in_range, aligned, np.nan)
+
+    def to_frame(self, region='global', value='streams'):
+        """(tracks x dates) slice as a dataframe indexed by track name"""
+        return pd.DataFrame(self.region_slice(region, value), index=self.track_names,
+                            columns=pd.DatetimeIndex(self.dates))
@@ -1,68 +1,32 @@
 # %%
 # Import libraries
+# Data loading/filtering lives in spotifyglobal_chart_data (pandas only),
+# the regression libraries are imported in the regression cell below
 import pandas as pd
 import numpy as np
-import glob
-import re
-from datetime import datetime, timedelta
-from scipy import stats
-from sklearn.preprocessing import PolynomialFeatures
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import r2_score
-import matplotlib.pyplot as plt
-import plotly.express as px
-import plotly.graph_objects as go
+import os
+from spotify_pipeline_metrics import metrics
+from spotifyglobal_chart_data import (DEFAULT_DATA_PATH, SONG_GROUPS, read_spotify_data, add_change_columns,
+                                      get_daily_totals, filter_spotify_data)
+from spotifyglobal_weekday import weekday_effects, add_weekend_shading
+from spotifyglobal_render import build_streams_figure
 
 # File paths with glob
-path = "C:\Users\mikae\Documents\GitHub\spotify-data-analysis\spotify_data_analysis_supplementary\spotify_official_csv"
-file_pattern = path + '*.csv'
-
-# Read csv files
-# Flow: 
-# Read all csv and append it into the dataframes list
-# Get the dates off the path and put them into their own column
-def read_spotify_data(file_pattern):
-    all_files = glob.glob(file_pattern)
-    dataframes = []
-
-    for file in all_files:
-        date_match = re.search(r'(\d{4}-\d{2}-\d{2})', file)
-        if date_match:
-            date_str = date_match.group(1)
-        date = pd.to_datetime(date_str)
-
-        df = pd.read_csv(file)
-        df['date'] = date
-        dataframes.append(df)
-
-    return pd.concat(dataframes, ignore_index=True)
+path = DEFAULT_DATA_PATH
+file_pattern = os.path.join(path, '*.csv')
 
 concatenated_df = read_spotify_data(file_pattern)
 
-# Calculate daily streams change, replace NaN with 0.
-# Sort values and group by needed because .diff() calculates the diff between rows.
-concatenated_df = concatenated_df.sort_values(['track_name', 'date'])
-concatenated_df['streams_change'] = concatenated_df.groupby('track_name')['streams'].diff().fillna(0)
-
-# Calculate percentage change of streams
-concatenated_df['streams_percent_change'] = concatenated_df.groupby('track_name')['streams'].pct_change().fillna(0) * 100
+# Load timings and counters (files read, bytes, rows)
+print(metrics.summary())
 
-# Get day of week, mark if weekend
-concatenated_df['day_of_week'] = concatenated_df['date'].dt.day_name()
-concatenated_df['is_weekend'] = concatenated_df['date'].dt.weekday >= 5
+# Streams change, percent change, day of week and weekend flag
+concatenated_df = add_change_columns(concatenated_df)
 
 concatenated_df
 
 # Daily stream totals dataframe
-daily_totals = concatenated_df.groupby('date').agg({
-    'streams' : 'sum',
-    'streams_change' : 'mean'
-}).rename(columns={
-    'streams_change' : 'mean_streams_change'
-})
-
-daily_totals['day_of_week'] = daily_totals.index.day_name()
-daily_totals['is_weekend'] = daily_totals.index.weekday >= 5
+daily_totals = get_daily_totals(concatenated_df)
 
 daily_totals
 
@@ -72,78 +36,13 @@ daily_totals
 
 
 # %%
-# Functions to filter the dataframe 
-
-def filter_by_rank(df, max_rank):
-    return df[(df['rank'] <= max_rank)]
-
-def filter_by_songs(df, songs):
-    if isinstance(songs, str):
-        songs = [songs]
-    return df[df['track_name'].isin(songs)]
-
-def filter_by_date_range(df, start_date, end_date):
-    return df[(df['date'] >= start_date) & (df['date'] <= end_date)]
-
-def filter_by_artist(df, artists):
-    if isinstance(artists, str):
-        artists = [artists]
-    return df[df['artist_names'].isin(artists)]
-
-def filter_spotify_data(df, 
-                        max_rank=None,
-                        songs=None,
-                        artists=None,
-                        start_date=None,
-                        end_date=None,
-                        ):
-    """
-    Master filtering function with multiple optional parameters
-    """
-    filtered_df = df.copy()
-    if max_rank:
-        filtered_df = filter_by_rank(filtered_df, max_rank)
-    if songs:
-        filtered_df = filter_by_songs(filtered_df, songs)
-    if artists:
-        filtered_df = filter_by_artist(filtered_df, artists)
-    if start_date and end_date:
-        filtered_df = filter_by_date_range(filtered_df, start_date, end_date)
-    
-    return filtered_df
+# Filtering functions are in spotifyglobal_chart_data:
+# filter_by_rank, filter_by_songs, filter_by_date_range, filter_by_artist, filter_spotify_data
 
 # Select filtering parameters to filter
 max_rank = 10
 
-SONG_GROUPS = {
-    'twice_songs': [
-        'TAKEDOWN (JEONGYEON, JIHYO, CHAEYOUNG)',
-        'Strategy'
-    ],
-    'KPDH_songs': [
-        'Golden',
-        'Your Idol',
-        'Soda Pop',
-        'How It’s Done',
-        'What It Sounds Like',
-        'Free',
-        'Takedown',
-        'TAKEDOWN (JEONGYEON, JIHYO, CHAEYOUNG)',
-        'Strategy'
-    ],
-    'KPDH_songs_excluding_twice': [
-        'Golden',
-        'Your Idol',
-        'Soda Pop',
-        'How It’s Done',
-        'What It Sounds Like',
-        'Free',
-        'Takedown',
-    ],
-    'one_song': [
-        'TAKEDOWN (JEONGYEON, JIHYO, CHAEYOUNG)'
-    ]
-}
+# Song groups are defined in spotifyglobal_chart_data.SONG_GROUPS
 
 start_date = '2025-08-23'
 end_date = '2025-09-12'
@@ -162,8 +61,8 @@ filtered_df = filter_spotify_data(concatenated_df, None, SONG_GROUPS['one_song']
 print(filtered_df)
 
 # %%
-# Plot simple line graph with plotly
-fig1 = px.line(filtered_df, x='date', y='streams', color='track_name')
+# Plot simple line graph with plotly (WebGL traces, each downsampled to at most 1000 points)
+fig1 = build_streams_figure(filtered_df, x='date', y='streams', color='track_name', max_points=1000)
 fig1.update_layout(
     title='Daily Spotify Global Streams Change by Track',
     xaxis_title='Date',
@@ -174,18 +73,52 @@ fig1.update_layout(
     height=450,
 )
 
-# Weekend background shading for the plot
-weekend_dates = filtered_df[filtered_df['is_weekend'] == True]['date'].unique()
-for weekend_date in weekend_dates:
-    fig1.add_vrect(
-        x0 = weekend_date - pd.Timedelta(hours=12),
-        x1 = weekend_date + pd.Timedelta(hours=12),
-        fillcolor = "gray",
-        opacity = 0.2,
-        line_width = 0,
-    )
+# Weekend background shading for the plot, one shape per weekend
+add_weekend_shading(fig1, filtered_df['date'], fillcolor="gray", opacity=0.2)
 
 fig1.show()
 
+# Write one chart per song group to files without opening a browser
+# from spotifyglobal_render import render_charts
+# render_charts(concatenated_df, SONG_GROUPS, 'charts', file_format='html')
+
+# %%
+# Day-of-week multipliers per track and for the whole chart
+track_weekday_effects, chart_weekday_effects = weekday_effects(concatenated_df)
+
+chart_weekday_effects
+
+# Tracks with the strongest weekend lift
+track_weekday_effects.sort_values('weekend_lift', ascending=False).head(20)
+
+# %%
+# Functions for regression analysis
+# Linear, exponential and polynomial fits for every track in one batched NumPy solve
+from spotifyglobal_trends import fit_track_trends
+
+track_trends = fit_track_trends(concatenated_df)
+
+# Fastest decaying tracks that are still on the chart, with projected chart exit date
+track_trends[track_trends['projected_exit_date'].notna()].sort_values('half_life_days').head(20)
+
+# Trends for the selected songs
+track_trends.loc[track_trends.index.intersection(SONG_GROUPS['KPDH_songs'])]
+
 # %%
-# Functions for regression analysis
\ No newline at end of file
+# Cross-track analytics on the dense (track x date x region) matrix
+from spotifyglobal_chart_matrix import ChartMatrix
+
+chart_matrix = ChartMatrix.from_dataframe(concatenated_df)
+
+# Songs whose daily streams move together with TAKEDOWN
+chart_matrix.similar_tracks('TAKEDOWN (JEONGYEON, JIHYO, CHAEYOUNG)', top=10)
+
+# Correlation between the KPDH songs
+kpdh_rows = chart_matrix.track_rows(SONG_GROUPS['KPDH_songs'])
+kpdh_correlation = pd.DataFrame(chart_matrix.track_correlation()[np.ix_(kpdh_rows, kpdh_rows)],
+                                index=[chart_matrix.track_names[i] for i in kpdh_rows],
+                                columns=[chart_matrix.track_names[i] for i in kpdh_rows])
+kpdh_correlation
+
+# Streams by days since chart entry for the same songs
+kpdh_cohort = chart_matrix.cohort_curves(max_days=60)[kpdh_rows]
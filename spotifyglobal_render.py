@@ -0,0 +1,157 @@
+# Rendering layer for large multi-track charts
+# Every series is downsampled to about screen resolution with LTTB (Largest-Triangle-Three-Buckets)
+# and drawn with plotly Scattergl (WebGL), so hundreds of tracks over years of daily data stay responsive.
+# Charts can be written straight to files for batch report generation without opening a browser.
+
+# Import libraries
+import numpy as np
+import pandas as pd
+import os
+from spotify_pipeline_metrics import metrics
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling
+    Keeps the first and last point and, per bucket, the point forming the largest triangle with
+    the previously kept point and the average of the next bucket, so peaks and drops survive
+    x, y: 1-D numeric arrays (x sorted), returns the indices of the kept points
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # n_out - 2 buckets between the first and last point
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    # Average point of the bucket after each bucket (the last point for the last bucket), all at once
+    bounds = np.append(edges, n)
+    x_sums = np.concatenate(([0.0], np.cumsum(x)))
+    y_sums = np.concatenate(([0.0], np.cumsum(y)))
+    next_counts = bounds[2:] - bounds[1:-1]
+    next_x = (x_sums[bounds[2:]] - x_sums[bounds[1:-1]]) / next_counts
+    next_y = (y_sums[bounds[2:]] - y_sums[bounds[1:-1]]) / next_counts
+
+    # The kept point depends on the previous one, so buckets are walked in order.
+    # For small buckets plain float arithmetic beats the per-call overhead of NumPy on tiny slices.
+    small_buckets = n / n_out < 32
+    if small_buckets:
+        x_values, y_values = x.tolist(), y.tolist()
+        edges, next_x, next_y = edges.tolist(), next_x.tolist(), next_y.tolist()
+
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        avg_x, avg_y = next_x[i], next_y[i]
+
+        # Twice the triangle area for every candidate in the bucket
+        if small_buckets:
+            xa, ya = x_values[a], y_values[a]
+            dx, dy = xa - avg_x, avg_y - ya
+            best_area = -1.0
+            for j in range(start, end):
+                area = abs(dx * (y_values[j] - ya) - (xa - x_values[j]) * dy)
+                if area > best_area:
+                    best_area, a = area, j
+        else:
+            area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+            a = start + int(area.argmax())
+        selected[i + 1] = a
+
+    return selected
+
+def downsample_series(dates, values, max_points=1000):
+    """
+    Drop missing values and LTTB-downsample one date series to at most max_points
+    Returns (dates, values) as arrays
+    """
+    dates = pd.DatetimeIndex(dates)
+    values = np.asarray(values, dtype=np.float64)
+    keep = np.isfinite(values)
+    dates, values = dates[keep], values[keep]
+
+    if max_points and len(values) > max_points:
+        indices = lttb(dates.asi8, values, max_points)
+        dates, values = dates[indices], values[indices]
+        metrics.incr('points_dropped', int(keep.sum() - len(indices)))
+
+    return dates.to_numpy(), values
+
+def build_streams_figure(df, x='date', y='streams', color='track_name', max_points=1000,
+                         title=None, weekend_shading=False):
+    """
+    Plotly figure with one Scattergl line per `color` group, each downsampled to max_points
+    weekend_shading: add one shaded rectangle per weekend (spotifyglobal_weekday.add_weekend_shading)
+    """
+    import plotly.graph_objects as go
+
+    with metrics.stage('build_figure'):
+        # Creating the figure with all traces at once is much faster than add_trace per track
+        traces = []
+        for name, group in df.sort_values(x).groupby(color, sort=False):
+            dates, values = downsample_series(group[x], group[y], max_points)
+            traces.append(go.Scattergl(x=dates, y=values, mode='lines', name=str(name)))
+        fig = go.Figure(data=traces)
+
+        fig.update_layout(
+            title=title,
+            xaxis_title='Date',
+            yaxis_title=y.replace('_', ' ').capitalize(),
+            legend_title=color.replace('_', ' ').title(),
+            hovermode='x unified',
+        )
+
+        if weekend_shading:
+            from spotifyglobal_weekday import add_weekend_shading
+            add_weekend_shading(fig, df[x].unique())
+
+    return fig
+
+def write_figure(fig, output_file):
+    """
+    Write a plotly figure without opening a browser
+    .html works out of the box (plotly.js loaded from the CDN), .png/.svg/.pdf need kaleido
+    """
+    directory = os.path.dirname(output_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    with metrics.stage('write', file=output_file):
+        if output_file.endswith('.html'):
+            fig.write_html(output_file, include_plotlyjs='cdn')
+        else:
+            try:
+                fig.write_image(output_file)
+            except (ImportError, ValueError, RuntimeError) as e:
+                print(f"Could not write {output_file}: {e}")
+                print("Static image export needs kaleido. Install with: pip install kaleido")
+                return None
+
+    metrics.incr('charts_written')
+    return output_file
+
+def render_charts(df, song_groups, output_dir, file_format='html', max_points=1000, weekend_shading=True):
+    """
+    Batch-render one streams chart per song group into output_dir
+    song_groups: {chart name: list of track names}, e.g. SONG_GROUPS
+    Returns the list of written files
+    """
+    written = []
+    for group_name, songs in song_groups.items():
+        group_df = df[df['track_name'].isin(songs)]
+        if group_df.empty:
+            print(f"No data for song group: {group_name}")
+            continue
+
+        fig = build_streams_figure(group_df, max_points=max_points, title=f'Daily Spotify Streams: {group_name}',
+                                   weekend_shading=weekend_shading)
+        output_file = write_figure(fig, os.path.join(output_dir, f'{group_name}.{file_format}'))
+        if output_file:
+            written.append(output_file)
+
+    return written
@@ -8,6 +8,10 @@ import re
 from time import sleep
 from datetime import datetime
 import numpy as np
+from spotify_pipeline_metrics import metrics, configure_logging
+
+# Status codes worth retrying: rate limited or temporary server errors
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
 
 def get_song_metadata(soup):
     """Extract song and metadata from page"""
@@ -27,10 +31,20 @@ def get_song_metadata(soup):
     except:
         return "Unknown", "Unknown"
 
-def parse_kworb_song_page(url, delay=2, view_type='weekly'):
+def get_retry_wait(response, attempt, retry_backoff=1):
+    """Seconds to wait before the next attempt: the Retry-After header if present, else exponential backoff"""
+    retry_after = response.headers.get('Retry-After') if response.headers else None
+    if retry_after and retry_after.strip().replace('.', '', 1).isdigit():
+        return float(retry_after)
+    return retry_backoff * 2 ** attempt
+
+def parse_kworb_song_page(url, delay=2, view_type='weekly', session=None, max_retries=3, retry_backoff=1):
     """
     Scrape streaming data from a kworb song page
     view_type: 'weekly' or 'daily' - determines which data to scrape
+    session: anything with requests' get(url, headers=...) (requests.Session, spotify_replay.ReplaySession, ...),
+             defaults to requests
+    max_retries: retries for 429 and 5xx responses, waiting Retry-After or retry_backoff * 2^attempt seconds
     Returns a DataFrame with date, position, streams for each country
     """
     print(f"Scraping: {url} ({view_type} view)")
@@ -40,16 +54,32 @@ def parse_kworb_song_page(url, delay=2, view_type='weekly'):
     }
 
     try:
-        # Make the HTTP Request
-        response = requests.get(url, headers=headers)
+        # Make the HTTP Request, retrying rate limits and temporary server errors
+        session = session or requests
+        for attempt in range(max_retries + 1):
+            with metrics.stage('fetch', url=url):
+                response = session.get(url, headers=headers)
+            metrics.incr('requests')
+            metrics.incr('bytes_downloaded', len(response.content))
+
+            if response.status_code not in RETRY_STATUS_CODES or attempt == max_retries:
+                break
+
+            wait = get_retry_wait(response, attempt, retry_backoff)
+            print(f"Status {response.status_code} for {url}, retrying in {wait:.1f}s ({attempt + 1}/{max_retries})")
+            metrics.incr('retries')
+            metrics.incr(f'status_{response.status_code}')
+            sleep(wait)
         sleep(delay)
 
         if response.status_code != 200:
             print(f"Failed to fetch {url}. Status code: {response.status_code}")
+            metrics.incr('failed_requests')
             return None        
         
         # Parse the HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
+        with metrics.stage('parse', url=url):
+            soup = BeautifulSoup(response.text, 'html.parser')
         
         # Get song metadata
         title, artist = get_song_metadata(soup)
@@ -91,81 +121,84 @@ def parse_kworb_song_page(url, delay=2, view_type='weekly'):
         print(f"Found {len(headers)} columns: {headers}")
 
         # Process data rows
-        data_rows = []
+        with metrics.stage('extract_rows', url=url):
+            data_rows = []
 
-        for row in rows[1:]:  # Skip header row
-            cells = row.find_all('td')
-            if not cells:
-                continue
+            for row in rows[1:]:  # Skip header row
+                cells = row.find_all('td')
+                if not cells:
+                    continue
 
-            # Get the date from first cell
-            date_cell = cells[0].get_text().strip()
+                # Get the date from first cell
+                date_cell = cells[0].get_text().strip()
             
-            # Skip Total and Peak rows
-            if date_cell in ['Total', 'Peak']:
-                continue
+                # Skip Total and Peak rows
+                if date_cell in ['Total', 'Peak']:
+                    continue
             
-            # Check if this is a valid date row (YYYY/MM/DD format)
-            if not re.match(r'^\d{4}/\d{2}/\d{2}', date_cell):
-                continue
-
-            try:
-                # Convert date format from YYYY/MM/DD to YYYY-MM-DD
-                date_obj = datetime.strptime(date_cell, '%Y/%m/%d')
-                formatted_date = date_obj.strftime('%Y-%m-%d')
-
-                row_data = {
-                    'date': formatted_date, 
-                    'title': title, 
-                    'artist': artist,
-                    'view_type': view_type
-                }
-
-                # Process each country column
-                for i, country in enumerate(headers[1:], 1):  # Skip 'Date' column
-                    if i < len(cells):
-                        cell = cells[i]
-                        cell_text = cell.get_text().strip()
-
-                        # Parse position and streams
-                        if cell_text == '--' or not cell_text:
-                            position = None
-                            streams = None
-                        else:
-                            # Look for position (in span with class 'p') and streams (in span with class 's')
-                            position_span = cell.find('span', class_='p')
-                            streams_span = cell.find('span', class_='s')
+                # Check if this is a valid date row (YYYY/MM/DD format)
+                if not re.match(r'^\d{4}/\d{2}/\d{2}', date_cell):
+                    continue
+
+                try:
+                    # Convert date format from YYYY/MM/DD to YYYY-MM-DD
+                    date_obj = datetime.strptime(date_cell, '%Y/%m/%d')
+                    formatted_date = date_obj.strftime('%Y-%m-%d')
+
+                    row_data = {
+                        'date': formatted_date, 
+                        'title': title, 
+                        'artist': artist,
+                        'view_type': view_type
+                    }
+
+                    # Process each country column
+                    for i, country in enumerate(headers[1:], 1):  # Skip 'Date' column
+                        if i < len(cells):
+                            cell = cells[i]
+                            cell_text = cell.get_text().strip()
+
+                            # Parse position and streams
+                            if cell_text == '--' or not cell_text:
+                                position = None
+                                streams = None
+                            else:
+                                # Look for position (in span with class 'p') and streams (in span with class 's')
+                                position_span = cell.find('span', class_='p')
+                                streams_span = cell.find('span', class_='s')
                             
-                            position = int(position_span.get_text().strip()) if position_span else None
+                                position = int(position_span.get_text().strip()) if position_span else None
                             
-                            if streams_span:
-                                streams_text = streams_span.get_text().strip().replace(',', '')
-                                streams = int(streams_text) if streams_text.isdigit() else None
-                            else:
-                                streams = None
+                                if streams_span:
+                                    streams_text = streams_span.get_text().strip().replace(',', '')
+                                    streams = int(streams_text) if streams_text.isdigit() else None
+                                else:
+                                    streams = None
 
-                        # Add position and streams for this country
-                        row_data[f'{country}_position'] = position
-                        row_data[f'{country}_streams'] = streams
+                            # Add position and streams for this country
+                            row_data[f'{country}_position'] = position
+                            row_data[f'{country}_streams'] = streams
 
-                data_rows.append(row_data)
+                    data_rows.append(row_data)
 
-            except Exception as e:
-                print(f"Error processing row with date {date_cell}: {e}")
-                continue
+                except Exception as e:
+                    print(f"Error processing row with date {date_cell}: {e}")
+                    continue
 
         if not data_rows:
             print("No data rows found")
             return None
 
         # Create DataFrame
-        df = pd.DataFrame(data_rows)
+        with metrics.stage('build_df', url=url):
+            df = pd.DataFrame(data_rows)
 
-        # Convert date column to datetime
-        df['date'] = pd.to_datetime(df['date'])
+            # Convert date column to datetime
+            df['date'] = pd.to_datetime(df['date'])
 
-        # Sort by date
-        df = df.sort_values('date')
+            # Sort by date
+            df = df.sort_values('date')
+        metrics.incr('rows', len(df))
 
         print(f"Successfully scraped {len(df)} {view_type} records")
         return df
@@ -174,11 +207,13 @@ def parse_kworb_song_page(url, delay=2, view_type='weekly'):
         print(f"Error scraping {url}: {e}")
         return None
 
-def scrape_multiple_songs(song_ids, base_url="https://kworb.net/spotify/track/", delay=2, view_type='weekly'):
+def scrape_multiple_songs(song_ids, base_url="https://kworb.net/spotify/track/", delay=2, view_type='weekly',
+                          session=None, max_retries=3):
     """
     Scrape multiple songs from kworb
     song_ids: list of Spotify track IDs
     view_type: 'weekly' or 'daily' - determines which data to scrape
+    session / max_retries: passed to parse_kworb_song_page
     """
     all_data = []
 
@@ -186,14 +221,16 @@ def scrape_multiple_songs(song_ids, base_url="https://kworb.net/spotify/track/",
         print(f"\n--- Scraping song {i+1}/{len(song_ids)} ---")
         url = f"{base_url}{song_id}.html"
 
-        df = parse_kworb_song_page(url, delay, view_type)
+        df = parse_kworb_song_page(url, delay, view_type, session, max_retries)
 
         if df is not None:
+            metrics.incr('songs_scraped')
             # Add song_id to the dataframe
             df['song_id'] = song_id
             all_data.append(df)
         else:
             print(f"Failed to scrape data for song ID: {song_id}")
+            metrics.incr('songs_failed')
 
     if all_data:
         # Combine all DataFrames
@@ -257,7 +294,7 @@ def get_song_id_from_spotify_url(spotify_url):
         return spotify_url.split("track/")[1].split("?")[0]
     return None
 
-def scrape_both_views(song_ids, base_url="https://kworb.net/spotify/track/", delay=2):
+def scrape_both_views(song_ids, base_url="https://kworb.net/spotify/track/", delay=2, session=None, max_retries=3):
     """
     Scrape both weekly and daily data for multiple songs
     song_ids: list of Spotify track IDs
@@ -266,19 +303,24 @@ def scrape_both_views(song_ids, base_url="https://kworb.net/spotify/track/", del
     results = {}
     
     print("=== Scraping Weekly Data ===")
-    weekly_df = scrape_multiple_songs(song_ids, base_url, delay, 'weekly')
+    weekly_df = scrape_multiple_songs(song_ids, base_url, delay, 'weekly', session, max_retries)
     results['weekly'] = weekly_df
     
     print("\n=== Scraping Daily Data ===")
-    daily_df = scrape_multiple_songs(song_ids, base_url, delay, 'daily')
+    daily_df = scrape_multiple_songs(song_ids, base_url, delay, 'daily', session, max_retries)
     results['daily'] = daily_df
     
     return results
-def create_streaming_chart(df, song_id, countries=['Global', 'US', 'PH']):
-    """Create a streaming chart for visualization"""
+def create_streaming_chart(df, song_id, countries=['Global', 'US', 'PH'], max_points=1000, output_file=None):
+    """
+    Create a streaming chart for visualization
+    max_points: LTTB-downsample each country's series to this many points (None keeps all)
+    output_file: save the chart there (png, svg, pdf, ...) instead of showing it, for headless batch runs
+    """
     try:
         import matplotlib.pyplot as plt
         import matplotlib.dates as mdates
+        from spotifyglobal_render import downsample_series
 
         song_data = df[df['song_id'] == song_id].copy()
         if song_data.empty:
@@ -294,9 +336,10 @@ def create_streaming_chart(df, song_id, countries=['Global', 'US', 'PH']):
         for country in countries:
             streams_col = f'{country}_streams'
             if streams_col in song_data.columns:
-                data = song_data.dropna(subset=[streams_col])
-                if not data.empty:
-                    plt.plot(data['date'], data[streams_col], marker='o', label=country, linewidth=2)
+                dates, streams = downsample_series(song_data['date'], song_data[streams_col], max_points)
+                if len(streams):
+                    # Markers only while the individual points are still readable
+                    plt.plot(dates, streams, marker='o' if len(streams) <= 100 else None, label=country, linewidth=2)
 
         plt.title(f'{view_type.capitalize()} Streams: {title} by {artist}', fontsize=14, fontweight='bold')
         plt.xlabel('Date')
@@ -314,7 +357,12 @@ def create_streaming_chart(df, song_id, countries=['Global', 'US', 'PH']):
         plt.xticks(rotation=45)
         
         plt.tight_layout()
-        plt.show()
+        if output_file:
+            with metrics.stage('write', file=output_file):
+                plt.savefig(output_file)
+            plt.close()
+        else:
+            plt.show()
         
     except ImportError:
         print("Matplotlib not installed. Install with: pip install matplotlib")
@@ -329,20 +377,23 @@ if __name__ == "__main__":
         "1CPZ5BxNNd0n0nF4Orb9JS",  # Golden (from your original example)
     ]
 
+    configure_logging()
     print("Scraping song streaming data from kworb.net...")
 
     # Option 1: Scrape only weekly data
     print("\n=== Weekly Data Only ===")
     weekly_df = scrape_multiple_songs(song_ids, delay=2, view_type='weekly')
     if weekly_df is not None:
-        weekly_df.to_csv('kworb_weekly_data.csv', index=False)
+        with metrics.stage('write'):
+            weekly_df.to_csv('kworb_weekly_data.csv', index=False)
         print(f"Weekly data saved to 'kworb_weekly_data.csv' ({len(weekly_df)} records)")
 
     # Option 2: Scrape only daily data  
     print("\n=== Daily Data Only ===")
     daily_df = scrape_multiple_songs(song_ids, delay=2, view_type='daily')
     if daily_df is not None:
-        daily_df.to_csv('kworb_daily_data.csv', index=False)
+        with metrics.stage('write'):
+            daily_df.to_csv('kworb_daily_data.csv', index=False)
         print(f"Daily data saved to 'kworb_daily_data.csv' ({len(daily_df)} records)")
 
     # Option 3: Scrape both weekly and daily data
@@ -350,11 +401,13 @@ if __name__ == "__main__":
     both_data = scrape_both_views(song_ids, delay=2)
     
     if both_data['weekly'] is not None:
-        both_data['weekly'].to_csv('kworb_weekly_data.csv', index=False)
+        with metrics.stage('write'):
+            both_data['weekly'].to_csv('kworb_weekly_data.csv', index=False)
         print(f"Weekly data: {len(both_data['weekly'])} records")
         
     if both_data['daily'] is not None:
-        both_data['daily'].to_csv('kworb_daily_data.csv', index=False)
+        with metrics.stage('write'):
+            both_data['daily'].to_csv('kworb_daily_data.csv', index=False)
         print(f"Daily data: {len(both_data['daily'])} records")
 
     # Analyze trends
@@ -371,8 +424,12 @@ if __name__ == "__main__":
     if daily_df is not None and len(song_ids) > 0:
         create_streaming_chart(daily_df, song_ids[0], ['Global', 'US', 'PH'])
 
-print("Kworb scraper ready!")
-print("Usage examples:")
-print("- Weekly data: scrape_multiple_songs(song_ids, view_type='weekly')")
-print("- Daily data: scrape_multiple_songs(song_ids, view_type='daily')")
-print("- Both views: scrape_both_views(song_ids)")
\ No newline at end of file
+    # Timings, bytes downloaded and rows/sec for this run
+    metrics.emit('kworb_metrics.jsonl')
+
+    print("Kworb scraper done!")
+    print("Usage examples:")
+    print("- Weekly data: scrape_multiple_songs(song_ids, view_type='weekly')")
+    print("- Daily data: scrape_multiple_songs(song_ids, view_type='daily')")
+    print("- Both views: scrape_both_views(song_ids)")
+    print("- Command line: python spotify_cli.py scrape <song_id> ... --view daily")
\ No newline at end of file
@@ -0,0 +1,312 @@
+# Local chart-data query service
+# Loads the chart dataset once, keeps it in memory and answers HTTP queries with the same parameters
+# as filter_spotify_data plus a few aggregate endpoints, so several notebooks/dashboards can share one warm copy.
+# Responses are cached with LRU eviction and the cache is dropped when new daily CSV files land.
+#
+# Run:   python spotify_cli.py serve --port 8050
+# Query: http://127.0.0.1:8050/query?song_group=twice_songs&start_date=2025-08-23&end_date=2025-09-12
+#        http://127.0.0.1:8050/top_tracks?n=10
+#
+# Endpoints (all GET, JSON):
+#   /health        rows, files, dates, cache stats
+#   /query         max_rank, songs (repeatable), song_group, artists (repeatable), start_date, end_date, columns, limit
+#   /daily_totals  start_date, end_date
+#   /top_tracks    n, start_date, end_date
+#   /trends        songs, song_group (optional, default all tracks)
+#   /weekday       songs, song_group (optional, per-track multipliers for those songs)
+#   /metrics       timings and counters of this server
+
+# Import libraries
+import glob
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import pandas as pd
+from spotify_pipeline_metrics import metrics
+from spotifyglobal_chart_data import (DEFAULT_DATA_PATH, SONG_GROUPS, read_spotify_files, add_change_columns,
+                                      get_daily_totals, get_top_tracks, filter_spotify_data)
+
+# Files modified less than this many seconds ago may still be being written by a download
+SETTLE_SECONDS = 2
+
+class ChartDataService:
+    """
+    In-memory chart dataset with an LRU cache of serialized query results
+    The CSV folder is checked for new or changed files at most every check_interval seconds
+    """
+
+    def __init__(self, data_path=DEFAULT_DATA_PATH, cache_size=256, check_interval=30):
+        self.data_path = data_path
+        self.cache_size = cache_size
+        self.check_interval = check_interval
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self.generation = 0
+        self.file_state = {}
+        self.raw_df = None
+        self.df = None
+        self.last_check = 0.0
+        self.reload()
+
+    def _scan_files(self):
+        """{file: (size, modified time)} for every CSV in the data folder"""
+        state = {}
+        for file in glob.glob(os.path.join(self.data_path, '*.csv')):
+            stat = os.stat(file)
+            state[file] = (stat.st_size, stat.st_mtime)
+        return state
+
+    def _swap(self, file_state, raw_df):
+        """Replace the dataset and drop every cached result computed from the old one"""
+        df = add_change_columns(raw_df.copy())
+        with self.lock:
+            self.file_state = file_state
+            self.raw_df = raw_df
+            self.df = df
+            self.cache.clear()
+            self.generation += 1
+
+    def _read_files(self, files):
+        """
+        Read CSV files one by one, skipping any that fail to parse (e.g. a daily file created but not written yet)
+        Skipped files are left out of file_state, so they are tried again at the next check
+        Returns (dataframe or None if nothing could be read, list of the files read)
+        """
+        dataframes = []
+        read_files = []
+        for file in files:
+            try:
+                dataframes.append(read_spotify_files([file]))
+            except (ValueError, KeyError, OSError) as e:
+                metrics.incr('files_skipped')
+                print(f"Skipping {file}: {e}")
+                continue
+            read_files.append(file)
+
+        if not dataframes:
+            return None, read_files
+        return pd.concat(dataframes, ignore_index=True), read_files
+
+    def reload(self):
+        """Read every CSV file from scratch"""
+        file_state = self._scan_files()
+        raw_df, read_files = self._read_files(sorted(file_state))
+        if raw_df is None:
+            raise ValueError(f"No readable chart CSV files in {self.data_path}")
+        self._swap({file: file_state[file] for file in read_files}, raw_df)
+        self.last_check = time.monotonic()
+        print(f"Loaded {len(self.df)} rows from {len(self.file_state)} files")
+
+    def refresh_if_changed(self, force=False):
+        """
+        Pick up new daily files: only new files are read, changed or removed files trigger a full reload
+        Files that fail to parse are skipped and read errors keep the current data, so requests never fail here
+        Returns True if the data changed (the cache is then cleared)
+        """
+        if not force and time.monotonic() - self.last_check < self.check_interval:
+            return False
+
+        # Only one request thread scans the folder, the others keep answering from the current data
+        if not self.refresh_lock.acquire(blocking=force):
+            return False
+        try:
+            state = self._scan_files()
+            self.last_check = time.monotonic()
+            if state == self.file_state:
+                return False
+
+            # Wait until no file is being written, the next check picks the changes up
+            now = time.time()
+            if any(now - modified < SETTLE_SECONDS for size, modified in state.values()):
+                return False
+
+            changed = [f for f in self.file_state if state.get(f) != self.file_state[f]]
+            if changed:
+                self.reload()
+                return True
+
+            # Change columns depend on the previous day, so they are recomputed over the whole frame
+            new_files = sorted(set(state) - set(self.file_state))
+            new_df, read_files = self._read_files(new_files)
+            if new_df is None:
+                return False
+            file_state = {**self.file_state, **{file: state[file] for file in read_files}}
+            self._swap(file_state, pd.concat([self.raw_df, new_df], ignore_index=True))
+            metrics.incr('new_files_loaded', len(read_files))
+            print(f"Added {len(new_df)} rows from {len(read_files)} new files")
+            return True
+        except (ValueError, KeyError, OSError) as e:
+            metrics.incr('refresh_errors')
+            print(f"Could not refresh chart data, keeping the current data: {e}")
+            return False
+        finally:
+            self.refresh_lock.release()
+
+    def cached(self, key, compute):
+        """Return the cached response body for key, or compute, store and evict the least recently used"""
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                metrics.record_cache(True)
+                return self.cache[key]
+            generation = self.generation
+
+        metrics.record_cache(False)
+        body = compute()
+
+        with self.lock:
+            # Do not cache a result computed from data that was replaced in the meantime
+            if generation != self.generation:
+                return body
+            self.cache[key] = body
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+                metrics.incr('cache_evictions')
+        return body
+
+    # Query handlers, each returns a JSON-serialisable object
+
+    def _songs(self, params):
+        songs = list(params.get('songs', []))
+        for group in params.get('song_group', []):
+            if group not in SONG_GROUPS:
+                raise ValueError(f"Unknown song group: {group}. Available groups: {list(SONG_GROUPS)}")
+            songs += SONG_GROUPS[group]
+        return songs or None
+
+    def _dates(self, params):
+        """start_date / end_date parameters as timestamps (None if not given), ValueError if they do not parse"""
+        dates = []
+        for name in ('start_date', 'end_date'):
+            value = params.get(name, [None])[0]
+            dates.append(pd.to_datetime(value, format='%Y-%m-%d') if value else None)
+        return dates
+
+    def _date_range(self, df, params):
+        start_date, end_date = self._dates(params)
+        return filter_spotify_data(df, start_date=start_date, end_date=end_date)
+
+    def query(self, params):
+        max_rank = int(params['max_rank'][0]) if 'max_rank' in params else None
+        start_date, end_date = self._dates(params)
+        filtered_df = filter_spotify_data(self.df, max_rank, self._songs(params), params.get('artists'),
+                                          start_date, end_date)
+        if 'columns' in params:
+            filtered_df = filtered_df[params['columns'][0].split(',')]
+        if 'limit' in params:
+            filtered_df = filtered_df.head(int(params['limit'][0]))
+        return json.loads(filtered_df.to_json(orient='records', date_format='iso'))
+
+    def daily_totals(self, params):
+        daily_totals = get_daily_totals(self._date_range(self.df, params))
+        return json.loads(daily_totals.reset_index().to_json(orient='records', date_format='iso'))
+
+    def top_tracks(self, params):
+        n = int(params.get('n', [10])[0])
+        df = self._date_range(self.df, params)
+        top_tracks = get_top_tracks(df, n)
+        return json.loads(top_tracks.reset_index().to_json(orient='records'))
+
+    def trends(self, params):
+        from spotifyglobal_trends import fit_track_trends
+
+        trends = fit_track_trends(self.df)
+        songs = self._songs(params)
+        if songs:
+            trends = trends.loc[trends.index.intersection(songs)]
+        return json.loads(trends.reset_index().to_json(orient='records', date_format='iso'))
+
+    def weekday(self, params):
+        from spotifyglobal_weekday import weekday_effects
+
+        per_track, aggregate = weekday_effects(self.df)
+        songs = self._songs(params)
+        if songs:
+            per_track = per_track.loc[per_track.index.intersection(songs)]
+        return {
+            'aggregate': json.loads(aggregate.to_json()),
+            'tracks': json.loads(per_track.reset_index().to_json(orient='records')),
+        }
+
+    def health(self, params):
+        with self.lock:
+            cache_entries = len(self.cache)
+        return {
+            'rows': len(self.df),
+            'files': len(self.file_state),
+            'first_date': self.df['date'].min().strftime('%Y-%m-%d'),
+            'last_date': self.df['date'].max().strftime('%Y-%m-%d'),
+            'cache_entries': cache_entries,
+            'cache_size': self.cache_size,
+        }
+
+    def handle(self, path, params):
+        """
+        Route a request to its handler and return (status, body bytes)
+        Data endpoints are cached, health and metrics are not
+        Bad parameters give a 400, any other error a 500, both with a JSON error message
+        """
+        routes = {
+            '/query': self.query,
+            '/daily_totals': self.daily_totals,
+            '/top_tracks': self.top_tracks,
+            '/trends': self.trends,
+            '/weekday': self.weekday,
+        }
+
+        self.refresh_if_changed()
+        try:
+            if path == '/health':
+                return 200, json.dumps(self.health(params)).encode('utf-8')
+            if path == '/metrics':
+                return 200, json.dumps(metrics.summary(), default=str).encode('utf-8')
+            if path not in routes:
+                return 404, json.dumps({'error': f"Unknown endpoint: {path}", 'endpoints': sorted(routes)}).encode('utf-8')
+
+            key = (path, tuple(sorted((name, tuple(values)) for name, values in params.items())))
+            with metrics.stage(path.strip('/')):
+                body = self.cached(key, lambda: json.dumps(routes[path](params), default=str).encode('utf-8'))
+            return 200, body
+        except (KeyError, ValueError) as e:
+            return 400, json.dumps({'error': str(e)}).encode('utf-8')
+        except Exception as e:
+            # Always answer, otherwise the server drops the connection without a response
+            metrics.incr('server_errors')
+            return 500, json.dumps({'error': f"{type(e).__name__}: {e}"}).encode('utf-8')
+
+def make_handler(service):
+    """Request handler class bound to one ChartDataService"""
+
+    class ChartRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            status, body = service.handle(url.path, parse_qs(url.query))
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Keep the console quiet, request timings are in /metrics
+            pass
+
+    return ChartRequestHandler
+
+def serve(data_path=DEFAULT_DATA_PATH, host='127.0.0.1', port=8050, cache_size=256, check_interval=30):
+    """Load the dataset and serve it until interrupted"""
+    service = ChartDataService(data_path, cache_size, check_interval)
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    print(f"Serving chart data on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping chart data service")
+    finally:
+        server.server_close()
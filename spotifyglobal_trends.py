@@ -0,0 +1,122 @@
+# Trend / regression engine for all chart tracks at once
+# Instead of fitting one sklearn model per track, every track is a row of a padded (tracks x days) matrix
+# (NaN on days the track was not on the chart) and all fits are solved together with batched NumPy least squares.
+
+# Import libraries
+import numpy as np
+import pandas as pd
+
+def build_track_matrix(df, value_col='streams', track_col='track_name'):
+    """
+    Pivot the long chart dataframe into a padded (tracks x days) matrix
+    Days run from the first to the last date without gaps, missing values are NaN
+    Returns (matrix, track names, DatetimeIndex of the columns)
+    """
+    pivot = df.pivot_table(index=track_col, columns='date', values=value_col, aggfunc='sum')
+    all_dates = pd.date_range(pivot.columns.min(), pivot.columns.max(), freq='D')
+    pivot = pivot.reindex(columns=all_dates)
+    return pivot.to_numpy(dtype=float), list(pivot.index), all_dates
+
+def batch_polyfit(y, x, degree=1, min_points=3):
+    """
+    Fit y = c0 + c1*x + ... + cd*x^d to every row of y in one batched solve
+    y: (tracks x days) matrix with NaN for missing days, x: (days,) positions
+    Rows with fewer than max(min_points, degree + 1) values get NaN results
+    Returns (coefs (tracks x degree+1, lowest power first), r2 (tracks,), fitted (tracks x days))
+    """
+    mask = np.isfinite(y)
+    weights = mask.astype(float)
+    y_filled = np.where(mask, y, 0.0)
+    n_points = weights.sum(axis=1)
+
+    # Normal equations per row: (X^T W X) c = X^T W y, with W the row's 0/1 mask
+    # X^T W X only depends on the power sums of x over observed days, so it is one matmul
+    X = np.vander(x, degree + 1, increasing=True)
+    power_sums = weights @ np.vander(x, 2 * degree + 1, increasing=True)
+    powers = np.add.outer(np.arange(degree + 1), np.arange(degree + 1))
+    xtwx = power_sums[:, powers]
+    xtwy = y_filled @ X
+
+    # Swap unfittable rows for the identity so the batched solve never sees a singular matrix
+    valid = n_points >= max(min_points, degree + 1)
+    xtwx[~valid] = np.eye(degree + 1)
+    coefs = np.linalg.solve(xtwx, xtwy[..., None])[..., 0]
+    coefs[~valid] = np.nan
+
+    fitted = coefs @ X.T
+
+    # R² over the observed days of each row
+    with np.errstate(invalid='ignore', divide='ignore'):
+        row_mean = y_filled.sum(axis=1) / n_points
+        ss_res = (weights * (y_filled - fitted) ** 2).sum(axis=1)
+        ss_tot = (weights * (y_filled - row_mean[:, None]) ** 2).sum(axis=1)
+        r2 = np.where(ss_tot > 0, 1 - ss_res / ss_tot, np.nan)
+    r2[~valid] = np.nan
+
+    return coefs, r2, fitted
+
+def chart_entry_threshold(df, window=7):
+    """
+    Streams needed to stay on the chart: the lowest charting track's streams per day,
+    median over the last `window` days
+    """
+    daily_minimum = df.groupby('date')['streams'].min().sort_index()
+    return float(daily_minimum.tail(window).median())
+
+def fit_track_trends(df, degree=2, min_points=7, track_col='track_name'):
+    """
+    Fit linear, exponential (log-linear) and polynomial trends to every track's daily streams
+
+    Returns a dataframe with one row per track:
+    - days_on_chart, first_date, last_date
+    - slope_per_day, linear_r2: streams = a + b*day
+    - daily_growth_rate, exp_r2: log(streams) = a + b*day, growth rate is exp(b) - 1
+    - half_life_days (decaying tracks) / doubling_days (growing tracks)
+    - poly_r2, poly_curvature: streams polynomial of `degree` (curvature is the highest coefficient)
+    - projected_exit_date: day the exponential fit drops below the chart entry threshold,
+      only for decaying tracks still on the chart on the last date
+    """
+    streams, tracks, dates = build_track_matrix(df, 'streams', track_col)
+    x = np.arange(len(dates), dtype=float)
+    observed = np.isfinite(streams)
+
+    linear_coefs, linear_r2, _ = batch_polyfit(streams, x, 1, min_points)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_streams = np.where(streams > 0, np.log(streams), np.nan)
+    exp_coefs, exp_r2, log_fitted = batch_polyfit(log_streams, x, 1, min_points)
+    poly_coefs, poly_r2, _ = batch_polyfit(streams, x, degree, min_points)
+
+    growth = exp_coefs[:, 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        half_life = np.where(growth < 0, np.log(2) / -growth, np.nan)
+        doubling = np.where(growth > 0, np.log(2) / growth, np.nan)
+
+    # First/last observed day index per track
+    days_on_chart = observed.sum(axis=1)
+    first_idx = observed.argmax(axis=1)
+    last_idx = len(dates) - 1 - observed[:, ::-1].argmax(axis=1)
+
+    # Days until the fitted log streams cross the entry threshold, counted from the last date
+    threshold = np.log(chart_entry_threshold(df))
+    last_fitted = log_fitted[np.arange(len(tracks)), last_idx]
+    still_charting = observed[:, -1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_to_exit = np.where(still_charting & (growth < 0), (threshold - last_fitted) / growth, np.nan)
+    days_to_exit = np.clip(days_to_exit, 0, None)
+
+    exit_date = pd.Series(dates[-1], index=tracks) + pd.to_timedelta(np.ceil(days_to_exit), unit='D')
+
+    return pd.DataFrame({
+        'days_on_chart': days_on_chart,
+        'first_date': dates[first_idx],
+        'last_date': dates[last_idx],
+        'slope_per_day': linear_coefs[:, 1],
+        'linear_r2': linear_r2,
+        'daily_growth_rate': np.expm1(growth),
+        'exp_r2': exp_r2,
+        'half_life_days': half_life,
+        'doubling_days': doubling,
+        'poly_r2': poly_r2,
+        'poly_curvature': poly_coefs[:, -1],
+        'projected_exit_date': exit_date.to_numpy(),
+    }, index=pd.Index(tracks, name=track_col))
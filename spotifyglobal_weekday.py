@@ -0,0 +1,111 @@
+# Weekend / weekday effect analysis
+# Day-of-week multipliers for every track in one vectorized pass over the (tracks x days) matrix,
+# and weekend shading for plotly charts drawn as one shape per weekend instead of one per date.
+
+# Import libraries
+import numpy as np
+import pandas as pd
+from spotifyglobal_trends import build_track_matrix
+
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+def rolling_baseline(y, window=7):
+    """
+    Centered rolling mean along the days axis that ignores NaN
+    With window=7 every baseline covers each weekday once, so it has no weekday effect itself
+    """
+    mask = np.isfinite(y)
+    y_filled = np.where(mask, y, 0.0)
+
+    # Rolling sums of values and counts from cumulative sums, padded so the window stays centered
+    half = window // 2
+    pad = ((0, 0), (half + 1, half))
+    value_sums = np.pad(y_filled, pad).cumsum(axis=1)
+    count_sums = np.pad(mask.astype(float), pad).cumsum(axis=1)
+    window_values = value_sums[:, window:] - value_sums[:, :-window]
+    window_counts = count_sums[:, window:] - count_sums[:, :-window]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        baseline = window_values / window_counts
+    # Require the full window to be observed, otherwise the baseline would be missing some weekdays
+    return np.where(window_counts == window, baseline, np.nan)
+
+def weekday_multipliers(y, dates, window=7, min_weeks=2):
+    """
+    Day-of-week multipliers for every row of y (tracks x days)
+    Each day's streams are divided by the centered 7-day mean and averaged per weekday,
+    so 1.10 on Friday means Fridays run 10% above that track's weekly level
+    Rows with fewer than min_weeks observations of a weekday get NaN for it
+    Returns (tracks x 7) array, Monday first
+    """
+    ratio = y / rolling_baseline(y, window)
+    observed = np.isfinite(ratio)
+
+    # One-hot weekday matrix (days x 7) turns the per-weekday means into two matmuls
+    weekday = pd.DatetimeIndex(dates).weekday
+    one_hot = np.zeros((len(dates), 7))
+    one_hot[np.arange(len(dates)), weekday] = 1.0
+
+    sums = np.where(observed, ratio, 0.0) @ one_hot
+    counts = observed.astype(float) @ one_hot
+    with np.errstate(invalid='ignore', divide='ignore'):
+        multipliers = sums / counts
+    return np.where(counts >= min_weeks, multipliers, np.nan)
+
+def weekday_effects(df, track_col='track_name', window=7, min_weeks=2):
+    """
+    Per-track and aggregate day-of-week multipliers from the long chart dataframe
+    Returns (per-track dataframe with one column per day name, aggregate Series for total chart streams)
+    The aggregate also has a weekend_lift entry: mean Sat/Sun multiplier over mean Mon-Fri multiplier
+    """
+    streams, tracks, dates = build_track_matrix(df, 'streams', track_col)
+    per_track = pd.DataFrame(weekday_multipliers(streams, dates, window, min_weeks),
+                             index=pd.Index(tracks, name=track_col), columns=DAY_NAMES)
+
+    total_streams = df.groupby('date')['streams'].sum().reindex(dates).to_numpy()[None, :]
+    aggregate = pd.Series(weekday_multipliers(total_streams, dates, window, min_weeks)[0], index=DAY_NAMES,
+                          name='multiplier')
+    aggregate['weekend_lift'] = aggregate[DAY_NAMES[5:]].mean() / aggregate[DAY_NAMES[:5]].mean()
+
+    per_track['weekend_lift'] = per_track[DAY_NAMES[5:]].mean(axis=1) / per_track[DAY_NAMES[:5]].mean(axis=1)
+    return per_track, aggregate
+
+def weekday_effects_from_matrix(chart_matrix, region='global', window=7, min_weeks=2):
+    """Per-track day-of-week multipliers from a ChartMatrix region slice, indexed by track name"""
+    streams = np.asarray(chart_matrix.region_slice(region, 'streams'), dtype=np.float64)
+    per_track = pd.DataFrame(weekday_multipliers(streams, chart_matrix.dates, window, min_weeks),
+                             index=chart_matrix.track_names, columns=DAY_NAMES)
+    per_track['weekend_lift'] = per_track[DAY_NAMES[5:]].mean(axis=1) / per_track[DAY_NAMES[:5]].mean(axis=1)
+    return per_track
+
+def weekend_spans(dates):
+    """
+    Merge the weekend days in dates into contiguous (start, end) spans, one per weekend
+    Each span runs from 12:00 the day before the first weekend day to 12:00 after the last,
+    matching the +-12 hour shading around each date in the original chart
+    """
+    days = pd.DatetimeIndex(pd.unique(pd.DatetimeIndex(dates).normalize())).sort_values()
+    weekend_days = days[days.weekday >= 5]
+    if len(weekend_days) == 0:
+        return []
+
+    # A new span starts wherever the gap to the previous weekend day is more than one day
+    day_numbers = weekend_days.to_numpy().astype('datetime64[D]').astype(np.int64)
+    starts = np.flatnonzero(np.diff(day_numbers, prepend=day_numbers[0] - 2) > 1)
+    ends = np.append(starts[1:], len(weekend_days)) - 1
+
+    half_day = pd.Timedelta(hours=12)
+    return [(weekend_days[s] - half_day, weekend_days[e] + half_day) for s, e in zip(starts, ends)]
+
+def add_weekend_shading(fig, dates, fillcolor="gray", opacity=0.2):
+    """
+    Shade the weekends of a plotly figure, one rectangle per weekend
+    All shapes are set in a single layout update instead of one add_vrect call per date
+    """
+    shapes = [
+        dict(type='rect', xref='x', yref='paper', x0=start, x1=end, y0=0, y1=1,
+             fillcolor=fillcolor, opacity=opacity, line_width=0, layer='below')
+        for start, end in weekend_spans(dates)
+    ]
+    fig.update_layout(shapes=list(fig.layout.shapes) + shapes)
+    return fig